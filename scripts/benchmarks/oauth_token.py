@@ -0,0 +1,65 @@
+"""Requests per second of /oauth/token with its caches disabled and enabled.
+
+python scripts/benchmarks/oauth_token.py [requests]
+    Registers an issuer client in a temporary sqlite store, then sends
+    sequential token requests, 2,000 by default, through an in-process ASGI
+    client. Caches are disabled by expiring client hashes at once and never
+    reusing an issued token.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+CONTROLLER = os.path.join(os.path.dirname(__file__), "..", "..", "traceability-controller")
+sys.path.insert(0, os.path.abspath(CONTROLLER))
+for name, value in {
+    "TRACEABILITY_CONTROLLER_DOMAIN": "example.com",
+    "TRACTION_API_ENDPOINT": "http://127.0.0.1:1",
+    "TRACTION_API_KEY": "benchmark",
+    "TRACTION_TENANT_ID": "benchmark",
+    "VERIFIER_ENDPOINT": "http://127.0.0.1:1",
+    "POSTGRES_URI": f"sqlite://{tempfile.mkdtemp()}",
+    "WARMUP": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+from config import settings
+from app.api import app
+from app.controllers import auth
+from app.controllers.askar import AskarController, store_registry
+
+DID_LABEL = "benchmark"
+
+
+async def run(client, credentials, requests, cached):
+    auth.client_hashes.clear()
+    auth.issued_tokens.clear()
+    settings.CLIENT_HASH_CACHE_TTL = 300 if cached else 0
+    settings.OAUTH_TOKEN_REUSE_MARGIN = 60 if cached else settings.OAUTH_TOKEN_TTL
+    started = time.perf_counter()
+    for _ in range(requests):
+        r = await client.post("/oauth/token", data=credentials)
+        r.raise_for_status()
+    return requests / (time.perf_counter() - started)
+
+
+async def main(requests):
+    await AskarController().provision()
+    await AskarController(db=DID_LABEL).provision()
+    client_id, client_secret = await auth.new_issuer_client(DID_LABEL)
+    credentials = {"client_id": client_id, "client_secret": client_secret}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for cached in [False, True]:
+                rate = await run(client, credentials, requests, cached)
+                print(f"caches {'enabled' if cached else 'disabled'}: {rate:.0f} req/s")
+    finally:
+        await store_registry.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if sys.argv[1:] else 2000))
@@ -0,0 +1,62 @@
+"""Time per StatusBitmap.allocate call by fill level.
+
+python scripts/benchmarks/status_bitmap.py [length]
+    Fills a bitmap of length indexes, STATUS_LIST_LENGHT by default, to 0%,
+    50% and 99% and times allocations at that level, each allocated index is
+    released again so the level holds. The free-index list scan the bitmap
+    replaced is timed once with 1,000 entries taken for comparison.
+"""
+import os
+import random
+import sys
+import timeit
+
+CONTROLLER = os.path.join(os.path.dirname(__file__), "..", "..", "traceability-controller")
+sys.path.insert(0, os.path.abspath(CONTROLLER))
+for name, value in {
+    "TRACEABILITY_CONTROLLER_DOMAIN": "example.com",
+    "TRACTION_API_ENDPOINT": "http://127.0.0.1:1",
+    "TRACTION_API_KEY": "benchmark",
+    "TRACTION_TENANT_ID": "benchmark",
+    "VERIFIER_ENDPOINT": "http://127.0.0.1:1",
+    "POSTGRES_URI": "sqlite://",
+}.items():
+    os.environ.setdefault(name, value)
+
+from config import settings
+from app.status_bitmap import StatusBitmap
+
+FILL_LEVELS = [0, 0.5, 0.99]
+ALLOCATIONS = 20000
+
+
+def filled(length, level):
+    bitmap = StatusBitmap.new(length)
+    taken = random.sample(range(1, length - 1), int(length * level))
+    for index in taken:
+        bitmap.bits[index] = 1
+    bitmap.allocated = bitmap.bits.count()
+    return bitmap
+
+
+def allocate_and_release(bitmap):
+    bitmap.release([bitmap.allocate()])
+
+
+def previous_scan(length, entries):
+    return random.choice([e for e in range(length - 1) if e not in entries])
+
+
+def main(length):
+    print(f"{length} indexes, {ALLOCATIONS} allocations per level")
+    for level in FILL_LEVELS:
+        bitmap = filled(length, level)
+        seconds = timeit.timeit(lambda: allocate_and_release(bitmap), number=ALLOCATIONS)
+        print(f"  {level:4.0%} full: {seconds / ALLOCATIONS * 1e6:6.1f} us per allocation")
+    entries = random.sample(range(length - 1), 1000)
+    seconds = timeit.timeit(lambda: previous_scan(length, entries), number=1)
+    print(f"  previous list scan, 1000 taken: {seconds:.2f} s per allocation")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if sys.argv[1:] else settings.STATUS_LIST_LENGHT)
@@ -0,0 +1,140 @@
+"""Requests per second of one controller worker calling a slow traction.
+
+python scripts/benchmarks/upstream_concurrency.py [concurrency ...]
+    Starts a traction stand-in answering /jsonld/sign after 50 ms and one
+    uvicorn worker with two routes: /before posts to it with requests inside
+    the async handler, as the controller used to, /after goes through
+    token_manager and the pooled httpx client. Each route is loaded by
+    concurrent clients for 5 seconds per concurrency level, 1, 10 and 50 by
+    default.
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CONTROLLER = os.path.join(os.path.dirname(__file__), "..", "..", "traceability-controller")
+UPSTREAM_PORT = 8800
+WORKER_PORT = 8801
+UPSTREAM_DELAY = 0.05
+SECONDS = 5
+
+sys.path.insert(0, os.path.abspath(CONTROLLER))
+for name, value in {
+    "TRACEABILITY_CONTROLLER_DOMAIN": "example.com",
+    "TRACTION_API_ENDPOINT": f"http://127.0.0.1:{UPSTREAM_PORT}",
+    "TRACTION_API_KEY": "benchmark",
+    "TRACTION_TENANT_ID": "benchmark",
+    "VERIFIER_ENDPOINT": "http://127.0.0.1:1",
+    "POSTGRES_URI": "sqlite://",
+    "WARMUP": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def upstream():
+    app = FastAPI()
+
+    @app.post("/multitenancy/tenant/{tenant_id}/token")
+    async def token(tenant_id: str):
+        import jwt
+
+        return {"token": jwt.encode({"exp": int(time.time()) + 3600}, "benchmark")}
+
+    @app.post("/jsonld/sign")
+    async def sign(request: Request):
+        body = await request.json()
+        await asyncio.sleep(UPSTREAM_DELAY)
+        return {"signed_doc": body["doc"]["credential"]}
+
+    uvicorn.run(app, port=UPSTREAM_PORT, log_level="warning")
+
+
+def worker():
+    import requests
+    from config import settings
+    from app.token_manager import token_manager
+
+    app = FastAPI()
+    body = {"doc": {"credential": {"id": "urn:uuid:1"}, "options": {}}, "verkey": "benchmark"}
+
+    @app.post("/before")
+    async def before():
+        r = requests.post(f"{settings.TRACTION_API_ENDPOINT}/jsonld/sign", json=body)
+        return r.json()["signed_doc"]
+
+    @app.post("/after")
+    async def after():
+        r = await token_manager.post(f"{settings.TRACTION_API_ENDPOINT}/jsonld/sign", json=body)
+        return r.json()["signed_doc"]
+
+    uvicorn.run(app, port=WORKER_PORT, log_level="warning")
+
+
+async def load(path, concurrency):
+    url = f"http://127.0.0.1:{WORKER_PORT}{path}"
+    latencies = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        (await client.post(url)).raise_for_status()
+        end = time.perf_counter() + SECONDS
+
+        async def user():
+            while time.perf_counter() < end:
+                started = time.perf_counter()
+                (await client.post(url)).raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[user() for _ in range(concurrency)])
+        took = time.perf_counter() - started
+    latencies.sort()
+    return (
+        f"{len(latencies) / took:.1f} req/s, "
+        f"p50 {statistics.median(latencies) * 1000:.0f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms"
+    )
+
+
+async def wait_for(port):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on {port}")
+
+
+async def main(levels):
+    servers = [
+        subprocess.Popen([sys.executable, __file__, role]) for role in ["upstream", "worker"]
+    ]
+    try:
+        await wait_for(UPSTREAM_PORT)
+        await wait_for(WORKER_PORT)
+        print("concurrency  before  after")
+        for concurrency in levels:
+            before = await load("/before", concurrency)
+            after = await load("/after", concurrency)
+            print(f"{concurrency:<11}  {before}  {after}")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["upstream"]:
+        upstream()
+    elif sys.argv[1:] == ["worker"]:
+        worker()
+    else:
+        asyncio.run(main([int(level) for level in sys.argv[1:]] or [1, 10, 50]))
@@ -1,11 +1,41 @@
+import time
+
+# Cold start report, counts the imports below
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from app.validations import ValidationException
 from app.routers import authentication, identifiers, credentials, presentations
+from app import http_client
+from app.controllers.askar import store_registry
+from app.controllers.status_leases import status_leases
+from app.controllers.did_cache import did_cache
+from app.warmup import warmup
 from config import settings
 
-app = FastAPI(title=settings.PROJECT_TITLE, version=settings.PROJECT_VERSION)
+IMPORT_TIME = round(time.perf_counter() - IMPORT_STARTED, 4)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve health checks while warming up, ready is reported once done
+    warmup_task = asyncio.create_task(warmup.run()) if settings.WARMUP else None
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    warmup.mark(warm=False)
+    await status_leases.release_all()
+    await http_client.close_client()
+    await store_registry.close_all()
+
+
+app = FastAPI(
+    title=settings.PROJECT_TITLE, version=settings.PROJECT_VERSION, lifespan=lifespan
+)
 
 
 api_router = APIRouter()
@@ -22,12 +52,22 @@ async def health_check():
 
 @api_router.get("/status/ready", tags=["Server"], summary="Status check")
 async def status_check():
+    if settings.WARMUP and not warmup.all_ready():
+        return JSONResponse(status_code=503, content={"message": "Warming up"})
     return JSONResponse(status_code=200, content={})
 
 @api_router.get("/status/live", tags=["Server"], summary="Live check")
 async def live_check():
     return JSONResponse(status_code=200, content={})
 
+@api_router.get("/status/startup", tags=["Server"], summary="Cold start report")
+async def startup_report():
+    return JSONResponse(status_code=200, content={"import": IMPORT_TIME, **warmup.report()})
+
+@api_router.get("/status/caches", tags=["Server"], summary="Cache statistics")
+async def cache_stats():
+    return JSONResponse(status_code=200, content={"didResolution": did_cache.stats()})
+
 
 app.include_router(api_router)
 
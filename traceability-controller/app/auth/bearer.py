@@ -17,23 +17,22 @@ class JWTBearer(HTTPBearer):
                 raise ValidationException(
                     status_code=401, content={"message": "Invalid or expired token"}
                 )
-            if not self.verify_jwt(credentials.credentials):
+            claims = self.verify_jwt(credentials.credentials)
+            if not claims:
                 raise ValidationException(
                     status_code=401, content={"message": "Invalid or expired token"}
                 )
-            return credentials.credentials
+            # Decoded once per request, handlers read the claims from the request state
+            request.state.token_claims = claims
+            return claims
         else:
             raise ValidationException(
                 status_code=401, content={"message": "Invalid or expired token"}
             )
 
-    def verify_jwt(self, jwtoken: str) -> bool:
-        isTokenValid: bool = False
-
+    def verify_jwt(self, jwtoken: str) -> dict:
         try:
             payload = decodeJWT(jwtoken)
         except:
             payload = None
-        if payload:
-            isTokenValid = True
-        return isTokenValid
+        return payload or None
@@ -1,25 +1,18 @@
-import requests
 from config import settings
+from app import http_client
+from app.token_manager import token_manager
+from app.controllers import did_resolver
 from app.validations import ValidationException
 
 
-def request_token():
-    headers = {}
-    body = {"api_key": settings.TRACTION_API_KEY}
-    endpoint = f"{settings.TRACTION_API_ENDPOINT}/multitenancy/tenant/{settings.TRACTION_TENANT_ID}/token"
-    r = requests.post(endpoint, headers=headers, json=body)
-    try:
-        return r.json()["token"]
-    except:
-        raise ValidationException(
-            status_code=r.status_code, content={"message": r.text}
-        )
+async def request_token():
+    return await token_manager.get_token()
 
 
-def verify_token(token):
+async def verify_token(token):
     headers = {"Authorization": token}
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/tenant"
-    r = requests.get(endpoint, headers=headers)
+    r = await http_client.get(endpoint, headers=headers)
     try:
         return r.json()
     except:
@@ -28,11 +21,10 @@ def verify_token(token):
         )
 
 
-def create_api_key(did):
-    headers = {"Authorization": f"Bearer {request_token()}"}
+async def create_api_key(did):
     body = {"alias": did}
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/tenant/authentications/api"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await token_manager.post(endpoint, json=body)
     try:
         return r.json()["api_key"]
     except:
@@ -41,11 +33,10 @@ def create_api_key(did):
         )
 
 
-def create_did(did_method, key_type, did=None):
-    headers = {"Authorization": f"Bearer {request_token()}"}
+async def create_did(did_method, key_type, did=None):
     body = {"method": did_method, "options": {"key_type": key_type, "did": did}}
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/wallet/did/create"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await token_manager.post(endpoint, json=body)
     try:
         return r.json()["result"]["verkey"]
     except:
@@ -54,24 +45,13 @@ def create_did(did_method, key_type, did=None):
         )
 
 
-def resolve_did(did):
-    # headers = {"Authorization": f"Bearer {request_token()}"}
-    # endpoint = f"{settings.TRACTION_API_ENDPOINT}/resolver/resolve/{did}"
-    headers = {"X-API-KEY": settings.VERIFIER_API_KEY}
-    endpoint = f"{settings.VERIFIER_ENDPOINT}/resolver/resolve/{did}"
-    r = requests.get(endpoint, headers=headers)
-    try:
-        return r.json()["did_document"]
-    except:
-        raise ValidationException(
-            status_code=r.status_code, content={"message": r.text}
-        )
+async def resolve_did(did):
+    return await did_resolver.resolve_did(did)
 
 
-def get_verkey(did):
-    headers = {"Authorization": f"Bearer {request_token()}"}
+async def get_verkey(did):
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/wallet/did?did={did}"
-    r = requests.get(endpoint, headers=headers)
+    r = await token_manager.get(endpoint)
     try:
         return r.json()["results"][0]["verkey"]
     except:
@@ -80,11 +60,14 @@ def get_verkey(did):
         )
 
 
-def sign_json_ld(credential, options, verkey):
-    headers = {"Authorization": f"Bearer {request_token()}"}
+async def sign_json_ld(credential, options, verkey):
     body = {"doc": {"credential": credential, "options": options}, "verkey": verkey}
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/jsonld/sign"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await token_manager.post(
+        endpoint,
+        json=body,
+        timeout=settings.TRACTION_SIGN_TIMEOUT,
+    )
     try:
         return r.json()["signed_doc"]
     except:
@@ -93,11 +76,14 @@ def sign_json_ld(credential, options, verkey):
         )
 
 
-def verify_json_ld(vc, verkey):
-    headers = {"Authorization": f"Bearer {request_token()}"}
+async def verify_json_ld(vc, verkey):
     body = {"doc": vc, "verkey": verkey}
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/jsonld/verify"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await token_manager.post(
+        endpoint,
+        json=body,
+        timeout=settings.TRACTION_SIGN_TIMEOUT,
+    )
     try:
         return r.json()
     except:
@@ -106,11 +92,14 @@ def verify_json_ld(vc, verkey):
         )
 
 
-def issue_credential(credential, options):
-    headers = {"Authorization": f"Bearer {request_token()}"}
+async def issue_credential(credential, options):
     body = {"credential": credential, "options": options}
     endpoint = f"{settings.TRACTION_API_ENDPOINT}/vc/credentials/issue"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await token_manager.post(
+        endpoint,
+        json=body,
+        timeout=settings.TRACTION_SIGN_TIMEOUT,
+    )
     try:
         return r.json()["vc"]
     except:
@@ -119,12 +108,17 @@ def issue_credential(credential, options):
         )
 
 
-def verify_credential(vc):
+async def verify_credential(vc):
     # headers = {"Authorization": f'Bearer {request_token()}'}
     headers = {"X-API-KEY": settings.VERIFIER_API_KEY}
     body = {"verifiableCredential": vc, "options": {}}
     endpoint = f"{settings.VERIFIER_ENDPOINT}/vc/credentials/verify"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await http_client.post(
+        endpoint,
+        headers=headers,
+        json=body,
+        timeout=settings.VERIFIER_TIMEOUT,
+    )
     try:
         return r.json()
     except:
@@ -133,12 +127,17 @@ def verify_credential(vc):
         )
 
 
-def verify_presentation(vp):
+async def verify_presentation(vp):
     # headers = {"Authorization": f'Bearer {request_token()}'}
     headers = {"X-API-KEY": settings.VERIFIER_API_KEY}
     body = {"verifiablePresentation": vp, "options": {}}
     endpoint = f"{settings.VERIFIER_ENDPOINT}/vc/presentations/verify"
-    r = requests.post(endpoint, headers=headers, json=body)
+    r = await http_client.post(
+        endpoint,
+        headers=headers,
+        json=body,
+        timeout=settings.VERIFIER_TIMEOUT,
+    )
     try:
         return r.json()
     except:
@@ -1,59 +1,494 @@
 import json
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
 from aries_askar import Store, error
 from config import settings
-import time
 from app.validations import ValidationException
 from aries_askar.bindings import generate_raw_key
 
+# Derived once per worker instead of on every controller instance
+ASKAR_KEY = generate_raw_key(settings.TRACTION_API_KEY)
+
+
+def record_tags(data_key, value=None):
+    """Tags of a record, derived from its key and value so it can be queried.
+
+    The record kind is the key prefix. Tags starting with ~ are stored
+    unencrypted and support range queries, others only equality.
+    """
+    kind, _, record_id = data_key.partition(":")
+    tags = {"kind": kind}
+    if kind in ["statusListCredential", "statusListEntries"] and record_id:
+        tags["statusListId"] = record_id
+    if kind == "credentials" and isinstance(value, dict):
+        tags.update(credential_tags(value))
+    return tags
+
+
+def credential_tags(credential):
+    tags = {}
+    issuer = credential.get("issuer")
+    issuer = issuer.get("id") if isinstance(issuer, dict) else issuer
+    if issuer:
+        tags["issuer"] = issuer
+    types = credential.get("type")
+    if types:
+        tags["type"] = [types] if isinstance(types, str) else types
+    credential_status = credential.get("credentialStatus")
+    if isinstance(credential_status, dict) and "statusListCredential" in credential_status:
+        tags["statusListId"] = credential_status["statusListCredential"].split("/")[-1]
+    if isinstance(credential.get("issuanceDate"), str):
+        # Day bucket, queried with $gte and $lt
+        tags["~issued"] = credential["issuanceDate"][:10]
+    return tags
+
+
+# Constant tags written to every record before tags were derived
+LEGACY_TAGS = ["~plaintag", "enctag"]
+
+
+def merge_tags(tags, extra=None):
+    return {
+        name: sorted(value) if isinstance(value, set) else value
+        for name, value in {**(extra or {}), **tags}.items()
+        if name not in LEGACY_TAGS
+    }
+
+
+# Counter of the sequence numbers tagged on credentials as ~seq
+SEQUENCE_KEY = "credentialSequence"
+
+
+def sequence_tag(number):
+    # Zero padded so comparing the plaintext tags compares the numbers
+    return f"{number:012d}"
+
+
+async def next_sequence(txn, count):
+    """Reserves count sequence numbers in a transaction, returns the first.
+
+    The counter stays locked until the transaction ends, so credentials are
+    committed in sequence order and a reader past a number never misses one
+    committed later.
+    """
+    data = await txn.fetch("seq", SEQUENCE_KEY, for_update=True)
+    last = json.loads(data.value) if data else 0
+    operation = txn.replace if data else txn.insert
+    await operation("seq", SEQUENCE_KEY, json.dumps(last + count), record_tags(SEQUENCE_KEY))
+    return last + 1
+
+
+async def tag_sequence(txn, tags):
+    """Adds the next sequence numbers to the tags of the credentials inserted."""
+    tags = [record for record in tags if record.get("kind") == "credentials"]
+    if tags:
+        first = await next_sequence(txn, len(tags))
+        for number, record in enumerate(tags, first):
+            record["~seq"] = sequence_tag(number)
+
+
+class StoreRegistry:
+    """Keeps each store open once per worker so its connection pool is reused.
+
+    The least recently used store is evicted when more than
+    ASKAR_MAX_OPEN_STORES are open. Stores are used under a lease, an evicted
+    store is only closed once its last lease is released so sessions, scans
+    and transactions in progress are never cut off.
+    """
+
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self.stores = OrderedDict()
+        self.locks = {}
+        # Lease count of each store in use
+        self.leases = {}
+        # Evicted stores, closed on their last release
+        self.retired = set()
+
+    @staticmethod
+    def pool_uri(db):
+        options = {
+            "max_connections": settings.ASKAR_MAX_CONNECTIONS,
+            "min_connections": settings.ASKAR_MIN_CONNECTIONS,
+            "connect_timeout": settings.ASKAR_CONNECT_TIMEOUT,
+            "idle_timeout": settings.ASKAR_IDLE_TIMEOUT,
+        }
+        return f"{db}?{urlencode(options)}"
+
+    async def get(self, db, provision=False):
+        if db in self.stores and not provision:
+            self.stores.move_to_end(db)
+            return self.stores[db]
+        try:
+            async with self.locks.setdefault(db, asyncio.Lock()):
+                if db in self.stores and not provision:
+                    self.stores.move_to_end(db)
+                    return self.stores[db]
+                if provision:
+                    store = await Store.provision(
+                        self.pool_uri(db), "raw", ASKAR_KEY, recreate=False
+                    )
+                else:
+                    store = await Store.open(self.pool_uri(db), "raw", ASKAR_KEY)
+                previous = self.stores.pop(db, None)
+                self.stores[db] = store
+        finally:
+            # Locks are only kept for open stores
+            if db not in self.stores:
+                self.locks.pop(db, None)
+        if previous:
+            await self.retire(previous)
+        await self.evict()
+        return store
+
+    async def acquire(self, db):
+        """The open store of db, not closed until released."""
+        store = await self.get(db)
+        self.leases[store] = self.leases.get(store, 0) + 1
+        return store
+
+    async def release(self, store):
+        leases = self.leases.pop(store, 1) - 1
+        if leases:
+            self.leases[store] = leases
+        elif store in self.retired:
+            self.retired.discard(store)
+            await store.close()
+
+    @asynccontextmanager
+    async def lease(self, db):
+        store = await self.acquire(db)
+        try:
+            yield store
+        finally:
+            await self.release(store)
+
+    async def retire(self, store):
+        if store in self.leases:
+            self.retired.add(store)
+        else:
+            await store.close()
+
+    async def evict(self):
+        while len(self.stores) > self.max_open:
+            db, store = self.stores.popitem(last=False)
+            self.locks.pop(db, None)
+            await self.retire(store)
+
+    async def close(self, db):
+        store = self.stores.pop(db, None)
+        self.locks.pop(db, None)
+        if store:
+            await self.retire(store)
+
+    async def close_all(self):
+        while self.stores:
+            db, store = self.stores.popitem(last=False)
+            await store.close()
+        while self.retired:
+            await self.retired.pop().close()
+        self.locks.clear()
+        self.leases.clear()
+
+
+store_registry = StoreRegistry(settings.ASKAR_MAX_OPEN_STORES)
+
+
 class AskarController:
-    
-    def __init__(self, db=settings.ASKAR_DEFAULT_DB):
-        self.db = f'{settings.POSTGRES_URI}/{db}'
-        self.key = generate_raw_key(settings.TRACTION_API_KEY)
+    """Reads and writes the records of a store.
+
+    Each tenant has its own database, or with ASKAR_PROFILES its own profile in
+    the default database so all tenants share one connection pool. The default
+    store is the default profile of the default database in both modes.
+    """
+
+    def __init__(self, db=settings.ASKAR_DEFAULT_DB, profiles=settings.ASKAR_PROFILES):
+        if profiles and db != settings.ASKAR_DEFAULT_DB:
+            self.db = f'{settings.POSTGRES_URI}/{settings.ASKAR_DEFAULT_DB}'
+            self.profile = db
+        else:
+            self.db = f'{settings.POSTGRES_URI}/{db}'
+            self.profile = None
+        self.key = ASKAR_KEY
 
     async def provision(self):
-        await Store.provision(
-            self.db,
-            "raw",
-            self.key,
-            recreate=False,
-        )
+        if not self.profile:
+            await store_registry.get(self.db, provision=True)
+        else:
+            async with self.lease() as store:
+                try:
+                    await store.create_profile(self.profile)
+                except error.AskarError as e:
+                    # Provisioning an existing store opens it, same for profiles
+                    if e.code != error.AskarErrorCode.DUPLICATE:
+                        raise
+        await self.provision_sequence()
+
+    async def provision_sequence(self):
+        """Creates the credential sequence counter, an existing one is kept."""
+        async with self.lease() as store, store.session(self.profile) as session:
+            try:
+                await session.insert("seq", SEQUENCE_KEY, json.dumps(0), record_tags(SEQUENCE_KEY))
+            except error.AskarError as e:
+                if e.code != error.AskarErrorCode.DUPLICATE:
+                    raise
+
+    async def sequence(self):
+        """The last sequence number given to a committed credential."""
+        async with self.lease() as store, store.session(self.profile) as session:
+            data = await session.fetch("seq", SEQUENCE_KEY)
+        return json.loads(data.value) if data else 0
 
     async def open(self):
-        return await Store.open(self.db, "raw", self.key)
+        return await store_registry.get(self.db)
+
+    def lease(self):
+        return store_registry.lease(self.db)
 
     async def fetch(self, data_key):
-        store = await self.open()
-        async with store.session() as session:
+        async with self.lease() as store, store.session(self.profile) as session:
             data = await session.fetch("seq", data_key)
         return json.loads(data.value)
 
-    async def store(self, data_key, data):
-        store = await self.open()
-        async with store.session() as session:
-            await session.insert(
+    async def fetch_bytes(self, data_key):
+        async with self.lease() as store, store.session(self.profile) as session:
+            data = await session.fetch("seq", data_key)
+        return bytes(data.value)
+
+    @staticmethod
+    def encode(data):
+        return data if isinstance(data, bytes) else json.dumps(data)
+
+    async def store(self, data_key, data, tags=None):
+        await self.store_many({data_key: data}, tags)
+
+    async def store_many(self, data, tags=None):
+        """Insert several values in a single transaction, tags are added to each record."""
+        records = {
+            data_key: merge_tags(record_tags(data_key, value), tags)
+            for data_key, value in data.items()
+        }
+        async with self.lease() as store, store.transaction(self.profile) as txn:
+            await tag_sequence(txn, records.values())
+            for data_key, value in data.items():
+                await txn.insert("seq", data_key, self.encode(value), records[data_key])
+            await txn.commit()
+
+    async def remove(self, data_key):
+        async with self.lease() as store, store.session(self.profile) as session:
+            await session.remove("seq", data_key)
+
+    async def fetch_many(self, data_keys):
+        """Fetch several values in one session, missing keys map to None."""
+        values = {}
+        async with self.lease() as store, store.session(self.profile) as session:
+            for data_key in data_keys:
+                data = await session.fetch("seq", data_key)
+                values[data_key] = json.loads(data.value) if data else None
+        return values
+
+    async def update_atomic(self, data_key, modify, raw=False):
+        """Replace a value with modify(value) inside a transaction.
+
+        The record is locked for the duration of the transaction so concurrent
+        workers never modify it from the same snapshot. modify returns the new
+        value and a result which is passed back to the caller. Values are handled
+        as bytes when raw is set, otherwise as json.
+        """
+        async with self.lease() as store, store.transaction(self.profile) as txn:
+            data = await txn.fetch("seq", data_key, for_update=True)
+            value = bytes(data.value) if raw else json.loads(data.value)
+            value, result = modify(value)
+            await txn.replace(
                 "seq",
                 data_key,
-                json.dumps(data),
-                {"~plaintag": "a", "enctag": "b"},
+                self.encode(value),
+                merge_tags(record_tags(data_key, None if raw else value), data.tags),
             )
+            await txn.commit()
+        return result
 
     async def update(self, data_key, data):
-        store = await self.open()
-        async with store.session() as session:
+        async with self.lease() as store, store.session(self.profile) as session:
             await session.replace(
                 "seq",
                 data_key,
-                json.dumps(data),
-                {"~plaintag": "a", "enctag": "b"},
+                self.encode(data),
+                record_tags(data_key, data),
             )
 
+    async def find(self, tag_filter, limit=None):
+        """Values of the records matching a tag filter, keyed by data key."""
+        async with self.lease() as store, store.session(self.profile) as session:
+            entries = await session.fetch_all("seq", tag_filter, limit)
+        return {entry.name: json.loads(entry.value) for entry in entries}
 
-async def find_api_key(storeKey, apiKeyHash):
-    store = await open_store(storeKey)
-    async for row in store.scan("seq", {"~plaintag": "a", "enctag": "b"}):
-        if "api_key" in row.name:
-            pass
+    async def find_sequenced(self, tag_filter):
+        """(sequence number, value) of the credentials matching a tag filter, in sequence order."""
+        async with self.lease() as store, store.session(self.profile) as session:
+            entries = await session.fetch_all("seq", tag_filter)
+        entries = sorted(entries, key=lambda entry: entry.tags["~seq"])
+        return [(int(entry.tags["~seq"]), json.loads(entry.value)) for entry in entries]
+
+    async def scan(self, tag_filter=None, offset=None, limit=None):
+        """Yields (data key, value) of the records matching a tag filter.
+
+        Records are read from the database in batches while iterating, so the
+        whole result set is never held in memory.
+        """
+        async with self.lease() as store:
+            async for entry in store.scan("seq", tag_filter, offset, limit, self.profile):
+                yield entry.name, json.loads(entry.value)
+
+    async def count(self, tag_filter):
+        async with self.lease() as store, store.session(self.profile) as session:
+            return await session.count("seq", tag_filter)
+
+    async def retag(self, batch_size=500):
+        """Rewrite the tags of every record from its key and value.
+
+        Records written before tags were derived only carry placeholder tags.
+        Tags passed explicitly when a record was stored are kept, credentials
+        stored before they were numbered get the next sequence numbers.
+        """
+        await self.provision_sequence()
+        retagged = offset = 0
+        async with self.lease() as store:
+            while True:
+                entries = await store.scan("seq", offset=offset, limit=batch_size, profile=self.profile).fetch_all()
+                if not entries:
+                    return retagged
+                async with store.transaction(self.profile) as txn:
+                    tags = {}
+                    # The counter is only written by tag_sequence
+                    entries = [entry for entry in entries if entry.name != SEQUENCE_KEY]
+                    for entry in entries:
+                        try:
+                            value = json.loads(entry.value)
+                        except ValueError:
+                            value = None
+                        tags[entry.name] = merge_tags(record_tags(entry.name, value), entry.tags)
+                    await tag_sequence(txn, [record for record in tags.values() if "~seq" not in record])
+                    for entry in entries:
+                        await txn.replace("seq", entry.name, entry.value, tags[entry.name])
+                    await txn.commit()
+                retagged += len(entries)
+                offset += batch_size
+
+
+class AskarUnitOfWork:
+    """The reads and writes of one request on a tenant's store, in one transaction.
+
+    The transaction is opened on first use, so a request checks out a single
+    connection. Writes are queued and applied together by commit, reads see
+    queued writes. update_atomic locks the record until commit. Closing without
+    committing rolls everything back.
+    """
+
+    def __init__(self, askar):
+        self.askar = askar
+        self.leased_store = None
+        self.txn = None
+        self.writes = {}
+        self.tags = {}
+
+    async def session(self):
+        if self.txn is None:
+            # Leased until close, so the store outlives the transaction
+            if self.leased_store is None:
+                self.leased_store = await store_registry.acquire(self.askar.db)
+            self.txn = await self.leased_store.transaction(self.askar.profile)
+        return self.txn
+
+    async def fetch_raw(self, data_keys, for_update=False):
+        values = {}
+        for data_key in data_keys:
+            if data_key in self.writes:
+                values[data_key] = self.writes[data_key][1]
+                continue
+            txn = await self.session()
+            data = await txn.fetch("seq", data_key, for_update=for_update)
+            values[data_key] = bytes(data.value) if data else None
+            if data:
+                self.tags[data_key] = data.tags
+        return values
+
+    async def fetch_many(self, data_keys):
+        """Fetch several values, missing keys map to None."""
+        return {
+            data_key: json.loads(value) if value is not None else None
+            for data_key, value in (await self.fetch_raw(data_keys)).items()
+        }
+
+    async def fetch(self, data_key):
+        return (await self.fetch_many([data_key]))[data_key]
+
+    async def fetch_bytes(self, data_key):
+        return (await self.fetch_raw([data_key]))[data_key]
+
+    def queue(self, operation, data_key, value, tags):
+        value = AskarController.encode(value)
+        self.writes[data_key] = (
+            operation,
+            value.encode() if isinstance(value, str) else value,
+            tags,
+        )
+
+    async def store(self, data_key, data, tags=None):
+        self.queue("insert", data_key, data, merge_tags(record_tags(data_key, data), tags))
+
+    async def store_many(self, data, tags=None):
+        for data_key, value in data.items():
+            await self.store(data_key, value, tags)
+
+    async def update(self, data_key, data):
+        self.queue("replace", data_key, data, record_tags(data_key, data))
+
+    async def update_atomic(self, data_key, modify, raw=False):
+        data = (await self.fetch_raw([data_key], for_update=True))[data_key]
+        value, result = modify(data if raw else json.loads(data))
+        operation = self.writes.get(data_key, ("replace",))[0]
+        tags = merge_tags(record_tags(data_key, None if raw else value), self.tags.get(data_key))
+        self.queue(operation, data_key, value, tags)
+        return result
+
+    async def commit(self):
+        if not self.writes:
+            return await self.close()
+        txn = await self.session()
+        await tag_sequence(
+            txn, [tags for operation, value, tags in self.writes.values() if operation == "insert"]
+        )
+        for data_key, (operation, value, tags) in self.writes.items():
+            if operation == "insert":
+                await txn.insert("seq", data_key, value, tags)
+            else:
+                await txn.replace("seq", data_key, value, tags)
+        await txn.commit()
+        self.writes = {}
+        await self.close()
+
+    async def close(self):
+        self.writes = {}
+        try:
+            if self.txn is not None:
+                txn, self.txn = self.txn, None
+                await txn.close()
+        finally:
+            if self.leased_store is not None:
+                store, self.leased_store = self.leased_store, None
+                await store_registry.release(store)
+
+
+async def unit_of_work(did_label: str):
+    """FastAPI dependency, the request's unit of work on the tenant's store."""
+    uow = AskarUnitOfWork(AskarController(did_label))
+    try:
+        yield uow
+    finally:
+        await uow.close()
 
 
 async def verify_client_hash(storeKey, clientHash):
@@ -91,27 +526,10 @@ async def append_client_hash(storeKey, client_hash):
             )
 
 
-async def did_label_exists(storeKey, did_label):
-    store = await open_store(storeKey)
-    async for row in store.scan("seq", {"~plaintag": "a", "enctag": "b"}):
-        if row.name == f"{did_label}:did_document":
-            return True
-    return False
-
-
-async def verify_token(storeKey, did_label, token):
-    token = token.replace("Bearer ", "")
-    store = await open_store(storeKey)
-    async for row in store.scan("seq", {"~plaintag": "a", "enctag": "b"}):
-        if row.name == f"{did_label}:oauth".lower():
-            oauthData = json.loads(row.value.decode("utf-8"))
-    if oauthData["access_token"] == token and oauthData["token_expiration"] >= int(
-        time.time()
-    ):
-        return True
-    raise ValidationException(
-        status_code=401, content={"message": "Invalid or expired token"}
-    )
+async def tenant_labels():
+    """Labels of the tenants registered in the default store."""
+    tenants = await AskarController().find({"kind": "tenant"})
+    return [tenant["didLabel"] for tenant in tenants.values()]
 
 
 async def get_credential(did_label, credentialId):
@@ -6,6 +6,25 @@ import secrets
 from app.validations import ValidationException
 from app.auth.handler import decodeJWT
 from app.utils import did_from_label
+from aries_askar import AskarError
+from cachetools import TLRUCache, TTLCache
+import time
+import jwt
+
+# did_label -> client_id of the tenant's issuer client
+client_bindings = TTLCache(
+    maxsize=settings.CLIENT_BINDING_CACHE_SIZE, ttl=settings.CLIENT_BINDING_CACHE_TTL
+)
+# client_id -> (expires, client hash), None for unknown clients
+client_hashes = TLRUCache(
+    maxsize=settings.CLIENT_HASH_CACHE_SIZE,
+    ttu=lambda client_id, entry, now: entry[0],
+    timer=time.time,
+)
+# client_id -> (token, expires) of the last token issued to the client
+issued_tokens = TTLCache(
+    maxsize=settings.CLIENT_HASH_CACHE_SIZE, ttl=settings.OAUTH_TOKEN_TTL
+)
 
 
 def can_issue(credential, did_label):
@@ -22,10 +41,20 @@ def can_issue(credential, did_label):
     return did
 
 
+async def fetch_client_hash(client_id):
+    entry = client_hashes.get(client_id)
+    if entry:
+        return entry[1]
+    client_hash = (await AskarController().fetch_many([f'clientHash:{client_id}']))[f'clientHash:{client_id}']
+    ttl = settings.CLIENT_HASH_CACHE_TTL if client_hash else settings.CLIENT_HASH_NEGATIVE_TTL
+    client_hashes[client_id] = (time.time() + ttl, client_hash)
+    return client_hash
+
+
 async def verify_client_hash(client_id, client_secret):
     try:
         client_hash = uuid.uuid5(uuid.UUID(client_id), client_secret)
-        if await AskarController().fetch(f'clientHash:{client_id}') != str(client_hash):
+        if await fetch_client_hash(client_id) != str(client_hash):
             raise ValidationException(
                 status_code=400,
                 content={"message": "Invalid client"},
@@ -37,11 +66,38 @@ async def verify_client_hash(client_id, client_secret):
         )
 
 
+def issue_token(client_id):
+    """Returns a token and its lifetime, reusing the client's last token while it's valid."""
+    now = int(time.time())
+    entry = issued_tokens.get(client_id)
+    if entry and entry[1] - now > settings.OAUTH_TOKEN_REUSE_MARGIN:
+        return entry[0], entry[1] - now
+    payload = {"client_id": client_id, "expires": now + settings.OAUTH_TOKEN_TTL}
+    token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    issued_tokens[client_id] = (token, payload["expires"])
+    return token, settings.OAUTH_TOKEN_TTL
+
+
+async def fetch_client_id(did_label):
+    client_id = client_bindings.get(did_label)
+    if client_id is None:
+        try:
+            client_id = (await AskarController(db=did_label).fetch_many(['clientId']))['clientId']
+        except AskarError:
+            # No store was provisioned for this label
+            client_id = None
+        if client_id:
+            client_bindings[did_label] = client_id
+    return client_id
+
+
 async def is_authorized(did_label, request):
-    token = request.headers.get("Authorization").replace("Bearer ", "")
-    request_client_id = decodeJWT(token)["client_id"]
-    stored_client_id = await AskarController(db=did_label).fetch('clientId')
-    if request_client_id != stored_client_id:
+    claims = getattr(request.state, 'token_claims', None)
+    if claims is None:
+        token = request.headers.get("Authorization").replace("Bearer ", "")
+        claims = decodeJWT(token) or {}
+    request_client_id = claims.get("client_id")
+    if not request_client_id or request_client_id != await fetch_client_id(did_label):
         raise ValidationException(status_code=401, content={"message": "Unauthorized"})
 
 
@@ -51,5 +107,9 @@ async def new_issuer_client(did_label):
     client_hash = uuid.uuid5(client_id, client_secret)
     await AskarController().store(f'clientHash:{str(client_id)}', str(client_hash))
     await AskarController(db=did_label).store('clientId', str(client_id))
+    client_bindings[did_label] = str(client_id)
+    client_hashes[str(client_id)] = (
+        time.time() + settings.CLIENT_HASH_CACHE_TTL, str(client_hash)
+    )
 
     return str(client_id), client_secret
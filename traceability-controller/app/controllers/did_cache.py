@@ -0,0 +1,72 @@
+import copy
+import time
+from cachetools import TLRUCache
+from config import settings
+from app.single_flight import SingleFlight
+from app.validations import ValidationException
+
+
+class DidResolutionCache:
+    """Resolved DID documents, keyed by DID.
+
+    Documents are kept for DID_CACHE_TTL seconds and not found results for
+    DID_CACHE_NEGATIVE_TTL seconds, so a DID that gets published shortly after a
+    failed lookup is picked up quickly. Concurrent lookups of the same DID share
+    one resolution. Other errors are not cached.
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = TLRUCache(
+            maxsize=maxsize, ttu=lambda did, entry, now: entry[0], timer=time.time
+        )
+        self.resolving = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.coalesced = 0
+
+    async def get(self, did, resolve):
+        entry = self.entries.get(did)
+        if entry:
+            if entry[1] is None:
+                self.negative_hits += 1
+                raise ValidationException(status_code=404, content=entry[2])
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+        if did in self.resolving:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return copy.deepcopy(await self.resolving.run(did, self._resolve, did, resolve))
+
+    async def _resolve(self, did, resolve):
+        try:
+            did_document = await resolve(did)
+        except ValidationException as e:
+            if e.status_code == 404:
+                # Only the content is kept, a cached exception would keep the
+                # traceback of every raise
+                self.entries[did] = (time.time() + self.negative_ttl, None, e.content)
+            raise
+        self.entries[did] = (time.time() + self.ttl, did_document)
+        return did_document
+
+    def invalidate(self, did):
+        self.entries.pop(did, None)
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "maxsize": self.entries.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+did_cache = DidResolutionCache(
+    settings.DID_CACHE_SIZE, settings.DID_CACHE_TTL, settings.DID_CACHE_NEGATIVE_TTL
+)
@@ -1,7 +1,10 @@
+import hashlib
 import json
-from aries_askar import Store, error
-from config import settings
 import time
+from aries_askar import AskarError
+from cachetools import TLRUCache
+from config import settings
+from app.single_flight import SingleFlight
 from app.validations import ValidationException
 from app.utils import did_from_label
 from app.controllers.askar import AskarController
@@ -9,7 +12,7 @@ from app.controllers.askar import AskarController
 
 
 class DidDocumentController:
-    
+
     def __init__(self, did_label):
         self.did_label = did_label
         self.id = did_from_label(did_label)
@@ -27,18 +30,18 @@ class DidDocumentController:
             'serviceEndpoint': f'{settings.HTTPS_BASE}/{settings.DID_NAMESPACE}/{did_label}'
         }
         self.service = [service]
-    
-    async def add_verkey(self):
+
+    def add_verkey(self, verkey):
         verification_method = {
             'id': f'{self.id}#verkey',
             'type': 'Ed25519VerificationKey2018',
             'controller': self.id,
-            'publicKeyBase58': await AskarController(self.did_label).fetch('verkey')
+            'publicKeyBase58': verkey
         }
         self.verification_method = [verification_method]
         self.authentication = [verification_method['id']]
         self.assertion_method = [verification_method['id']]
-    
+
     def as_json(self):
         return {
             '@context': self.context,
@@ -47,4 +50,80 @@ class DidDocumentController:
             'authentication': self.authentication,
             'assertionMethod': self.assertion_method,
             'service': self.service,
-        }
\ No newline at end of file
+        }
+
+
+class PublishedDidDocument:
+    """A tenant's did.json, serialized once and served as is."""
+
+    def __init__(self, did_label, verkey):
+        self.verkey = verkey
+        did_document = DidDocumentController(did_label)
+        did_document.add_verkey(verkey)
+        self.document = did_document.as_json()
+        self.body = json.dumps(self.document).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def headers(self):
+        return {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={settings.DID_DOCUMENT_MAX_AGE}",
+        }
+
+    def not_modified(self, request_headers):
+        if_none_match = request_headers.get("if-none-match", "")
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+
+class DidDocumentCache:
+    """Keeps the did.json of our tenants in memory.
+
+    The document is built when the DID is created and loaded from the tenant's
+    verkey by other workers on first use, concurrent loads share one read.
+    publish and invalidate apply to this worker immediately, other workers pick
+    up a key or service change within DID_DOCUMENT_CACHE_TTL seconds. Unknown
+    labels are remembered for DID_DOCUMENT_NEGATIVE_TTL seconds.
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = TLRUCache(
+            maxsize=maxsize, ttu=lambda did_label, entry, now: entry[0], timer=time.time
+        )
+        self.loading = SingleFlight()
+
+    async def get(self, did_label):
+        entry = self.entries.get(did_label)
+        if entry:
+            if entry[1] is None:
+                raise ValidationException(status_code=404, content={"message": "Not found"})
+            return entry[1]
+        return await self.loading.run(did_label, self._load, did_label)
+
+    async def _load(self, did_label):
+        try:
+            verkey = (await AskarController(did_label).fetch_many(["verkey"]))["verkey"]
+        except AskarError:
+            # No store was provisioned for this label
+            verkey = None
+        if verkey is None:
+            self.entries[did_label] = (time.time() + self.negative_ttl, None)
+            raise ValidationException(status_code=404, content={"message": "Not found"})
+        return self.publish(did_label, verkey)
+
+    def publish(self, did_label, verkey):
+        entry = PublishedDidDocument(did_label, verkey)
+        self.entries[did_label] = (time.time() + self.ttl, entry)
+        return entry
+
+    def invalidate(self, did_label):
+        self.entries.pop(did_label, None)
+
+
+did_documents = DidDocumentCache(
+    settings.DID_DOCUMENT_CACHE_SIZE,
+    settings.DID_DOCUMENT_CACHE_TTL,
+    settings.DID_DOCUMENT_NEGATIVE_TTL,
+)
@@ -0,0 +1,112 @@
+import base58
+import copy
+from urllib.parse import unquote
+from config import settings
+from app import http_client
+from app.controllers.did_cache import did_cache
+from app.controllers.did_document import did_documents
+from app.validations import ValidationException
+
+# Multicodec prefix of ed25519 public keys
+ED25519_PUB = b"\xed\x01"
+
+
+def local_did_label(did):
+    """Returns the did_label of a DID hosted by this controller, None otherwise."""
+    prefix = f"{settings.DID_WEB_BASE}:{settings.DID_NAMESPACE}:"
+    if not did.startswith(prefix):
+        return None
+    did_label = did[len(prefix):]
+    return did_label if did_label and ":" not in did_label else None
+
+
+async def local_did_document(did_label):
+    return copy.deepcopy((await did_documents.get(did_label)).document)
+
+
+def did_key_document(did):
+    # https://w3c-ccg.github.io/did-method-key/
+    multibase = did.split(":")[2]
+    try:
+        public_key = base58.b58decode(multibase[1:])
+    except ValueError:
+        public_key = b""
+    if multibase[:1] != "z" or public_key[:2] != ED25519_PUB or len(public_key) != 34:
+        return None
+    verification_method = f"{did}#{multibase}"
+    return {
+        "@context": [
+            "https://www.w3.org/ns/did/v1",
+            "https://w3id.org/security/v2",
+        ],
+        "id": did,
+        "verificationMethod": [
+            {
+                "id": verification_method,
+                "type": "Ed25519VerificationKey2018",
+                "controller": did,
+                "publicKeyBase58": base58.b58encode(public_key[2:]).decode(),
+            }
+        ],
+        "authentication": [verification_method],
+        "assertionMethod": [verification_method],
+        "capabilityInvocation": [verification_method],
+        "capabilityDelegation": [verification_method],
+    }
+
+
+def did_web_url(did):
+    # https://w3c-ccg.github.io/did-method-web/#read-resolve
+    segments = [unquote(segment) for segment in did.split(":")[2:]]
+    if len(segments) == 1:
+        return f"https://{segments[0]}/.well-known/did.json"
+    return f"https://{'/'.join(segments)}/did.json"
+
+
+async def resolve_did_web(did):
+    r = await http_client.get(did_web_url(did))
+    if r.status_code in [404, 410]:
+        raise ValidationException(status_code=404, content={"message": "Not found"})
+    try:
+        did_document = r.json()
+        valid = r.status_code == 200 and did_document["id"] == did
+    except:
+        valid = False
+    if not valid:
+        raise ValidationException(
+            status_code=502, content={"message": f"Could not resolve {did}"}
+        )
+    return did_document
+
+
+async def resolve_remote(did):
+    # headers = {"Authorization": f"Bearer {request_token()}"}
+    # endpoint = f"{settings.TRACTION_API_ENDPOINT}/resolver/resolve/{did}"
+    headers = {"X-API-KEY": settings.VERIFIER_API_KEY}
+    endpoint = f"{settings.VERIFIER_ENDPOINT}/resolver/resolve/{did}"
+    r = await http_client.get(
+        endpoint,
+        headers=headers,
+        timeout=settings.VERIFIER_TIMEOUT,
+    )
+    try:
+        return r.json()["did_document"]
+    except:
+        raise ValidationException(
+            status_code=r.status_code, content={"message": r.text}
+        )
+
+
+async def resolve_did(did):
+    """Resolves did:key and did:web in process, other methods with the verifier agent."""
+    did = did.split("#")[0]
+    if did.startswith("did:key:"):
+        did_document = did_key_document(did)
+        if did_document:
+            return did_document
+    elif did.startswith("did:web:"):
+        did_label = local_did_label(did)
+        if did_label:
+            return await local_did_document(did_label)
+        return await did_cache.get(did, resolve_did_web)
+    return await did_cache.get(did, resolve_remote)
@@ -27,7 +27,7 @@ async def register(did_label):
     did = from_org_id(did_label)
 
     # TODO, change to web
-    verkey = agent.create_did("sov", "ed25519", did)
+    verkey = await agent.create_did("sov", "ed25519", did)
 
     # Create did document
     didDocument = DidDocument(id=did)
@@ -0,0 +1,97 @@
+import asyncio
+from config import settings
+from app.controllers.askar import AskarController
+from app.single_flight import SingleFlight
+from app.controllers.status_lists import fetch_status_lists, rollover_status_list, status_list_keys
+from app.status_bitmap import StatusBitmap
+
+
+class StatusIndexLeases:
+    """Hands out status list indexes from blocks leased by this worker.
+
+    A block of free indexes of the tenant's active status list is marked as
+    allocated in the stored bitmap within a single transaction, so two workers
+    can never lease the same index. Indexes are then served from memory without
+    a storage round-trip. Unused indexes are returned to the bitmap on shutdown,
+    a worker that dies without shutting down leaks at most one block.
+
+    Once the active list fills past STATUS_LIST_ROLLOVER_THRESHOLD a new list is
+    opened in the background, so issuance doesn't stall when a list is full.
+    """
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.pools = {}
+        self.locks = {}
+        self.rollovers = SingleFlight()
+
+    async def next_index(self, did_label):
+        """Returns a (list_id, index) pair."""
+        pool = self.pools.setdefault(did_label, [])
+        async with self.locks.setdefault(did_label, asyncio.Lock()):
+            while not pool:
+                pool.extend(await self.lease(did_label, self.block_size))
+        return pool.pop()
+
+    async def next_indexes(self, did_label, count):
+        """Returns count (list_id, index) pairs, leasing a larger block if needed."""
+        pool = self.pools.setdefault(did_label, [])
+        async with self.locks.setdefault(did_label, asyncio.Lock()):
+            while len(pool) < count:
+                pool.extend(
+                    await self.lease(did_label, max(self.block_size, count - len(pool)))
+                )
+            indexes = pool[-count:]
+            del pool[-count:]
+        return indexes
+
+    async def lease(self, did_label, count):
+        list_id = (await fetch_status_lists(did_label))["active"]
+
+        def allocate(data):
+            bitmap = StatusBitmap.from_bytes(data, settings.STATUS_LIST_LENGHT)
+            free = bitmap.length - bitmap.allocated
+            indexes = [bitmap.allocate() for _ in range(min(count, free))]
+            return bitmap.to_bytes(), (indexes, bitmap.fill_level)
+
+        indexes, fill_level = await AskarController(did_label).update_atomic(
+            status_list_keys(list_id)[1], allocate, raw=True
+        )
+        if fill_level >= settings.STATUS_LIST_ROLLOVER_THRESHOLD:
+            rollover = self.rollover(did_label, list_id)
+            if not indexes:
+                # The list is full, wait for the next one
+                await asyncio.shield(rollover)
+        return [(list_id, index) for index in indexes]
+
+    def rollover(self, did_label, list_id):
+        # A failed rollover is retried by the next lease
+        return self.rollovers.start(
+            (did_label, list_id), rollover_status_list, did_label, list_id
+        )
+
+    async def release(self, did_label, list_id, indexes):
+        def free(data):
+            bitmap = StatusBitmap.from_bytes(data, settings.STATUS_LIST_LENGHT)
+            bitmap.release(indexes)
+            return bitmap.to_bytes(), None
+
+        await AskarController(did_label).update_atomic(
+            status_list_keys(list_id)[1], free, raw=True
+        )
+
+    async def release_all(self):
+        for did_label, pool in self.pools.items():
+            leased = {}
+            for list_id, index in pool:
+                leased.setdefault(list_id, []).append(index)
+            pool[:] = []
+            for list_id, indexes in leased.items():
+                try:
+                    await self.release(did_label, list_id, indexes)
+                except:
+                    # Leaked indexes only cost unused space in the list
+                    pass
+
+
+status_leases = StatusIndexLeases(settings.STATUS_LIST_LEASE_SIZE)
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from cachetools import LRUCache, TLRUCache
+from config import settings
+from app import http_client
+from app.single_flight import SingleFlight
+from app.utils import status_list_decode
+from app.validations import ValidationException
+
+
+class SignedStatusList:
+    """A signed status list credential and the http metadata served with it."""
+
+    def __init__(self, vc, digest):
+        self.vc = vc
+        self.digest = digest
+        self.body = json.dumps(vc).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.signed_at = time.time()
+        self.last_modified = formatdate(self.signed_at, usegmt=True)
+        self.expires = self.signed_at + settings.STATUS_LIST_TTL
+
+    @property
+    def refresh_at(self):
+        return self.expires - settings.STATUS_LIST_REFRESH_MARGIN
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires
+
+    def headers(self):
+        max_age = min(settings.STATUS_LIST_MAX_AGE, int(self.refresh_at - time.time()))
+        return {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": f"public, max-age={max(0, max_age)}",
+        }
+
+    def not_modified(self, request_headers):
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except:
+                return False
+            return since >= int(self.signed_at)
+        return False
+
+
+class SignedStatusListCache:
+    """Keeps signed status list credentials so public reads don't sign every time.
+
+    Entries are keyed by status list id and tied to a digest of the stored list,
+    a status change in any worker changes the digest and forces a new signature.
+    Concurrent misses share one signing call. When signing fails the last signed
+    copy is served and signing is retried in the background.
+    """
+
+    def __init__(self, maxsize):
+        self.entries = LRUCache(maxsize=maxsize)
+        self.signing = SingleFlight()
+        self.failing = set()
+
+    @staticmethod
+    def digest(status_list_credential):
+        return hashlib.sha256(
+            json.dumps(status_list_credential, sort_keys=True).encode()
+        ).hexdigest()
+
+    async def get(self, status_list_credential, sign):
+        key = status_list_credential["id"]
+        digest = self.digest(status_list_credential)
+        entry = self.entries.get(key)
+        if entry and entry.digest == digest and not entry.expired:
+            if time.time() >= entry.refresh_at:
+                self._sign(key, digest, status_list_credential, sign)
+            return entry
+        if entry and key in self.failing:
+            # Don't make every request wait on an unreachable signer
+            self._sign(key, digest, status_list_credential, sign)
+            return entry
+        try:
+            return await asyncio.shield(
+                self._sign(key, digest, status_list_credential, sign)
+            )
+        except ValidationException:
+            if entry:
+                return entry
+            raise
+
+    def _sign(self, key, digest, status_list_credential, sign):
+        # Background signing that fails is retried by a later request
+        return self.signing.start(
+            (key, digest), self._run_sign, key, digest, status_list_credential, sign
+        )
+
+    async def _run_sign(self, key, digest, status_list_credential, sign):
+        try:
+            entry = SignedStatusList(await sign(dict(status_list_credential)), digest)
+        except ValidationException:
+            self.failing.add(key)
+            raise
+        self.failing.discard(key)
+        self.entries[key] = entry
+        return entry
+
+
+class RemoteStatusListCache:
+    """Decoded status lists fetched on the verification path, keyed by url.
+
+    An entry lives until the list credential's expirationDate or the http cache
+    lifetime, whichever comes first. The cache is bounded by the total size of
+    the decoded lists and concurrent lookups of the same url share one fetch.
+    """
+
+    def __init__(self, max_bytes):
+        self.entries = TLRUCache(
+            maxsize=max_bytes,
+            ttu=lambda url, entry, now: entry[0],
+            timer=time.time,
+            getsizeof=lambda entry: len(entry[1]) // 8,
+        )
+        self.fetching = SingleFlight()
+
+    async def get(self, url):
+        entry = self.entries.get(url)
+        if entry:
+            return entry[1]
+        return await self.fetching.run(url, self._fetch, url)
+
+    async def _fetch(self, url):
+        r = await http_client.get(url)
+        try:
+            status_list_vc = r.json()
+            status_list = status_list_decode(
+                status_list_vc["credentialSubject"]["encodedList"]
+            )
+        except:
+            raise ValidationException(
+                status_code=r.status_code, content={"message": r.text}
+            )
+        expires = min(self._http_expiry(r.headers), self._vc_expiry(status_list_vc))
+        if expires > time.time() and len(status_list) // 8 <= self.entries.maxsize:
+            self.entries[url] = (expires, status_list)
+        return status_list
+
+    @staticmethod
+    def _http_expiry(headers):
+        cache_control = headers.get("cache-control", "").lower()
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return 0
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        if max_age:
+            return time.time() + int(max_age.group(1))
+        if headers.get("expires"):
+            try:
+                return parsedate_to_datetime(headers["expires"]).timestamp()
+            except:
+                return 0
+        return time.time() + settings.STATUS_LIST_REMOTE_TTL
+
+    @staticmethod
+    def _vc_expiry(status_list_vc):
+        if "expirationDate" not in status_list_vc:
+            return float("inf")
+        try:
+            return datetime.fromisoformat(status_list_vc["expirationDate"]).timestamp()
+        except ValueError:
+            return 0
+
+
+signed_status_lists = SignedStatusListCache(settings.STATUS_LIST_CACHE_SIZE)
+remote_status_lists = RemoteStatusListCache(settings.STATUS_LIST_REMOTE_CACHE_BYTES)
@@ -0,0 +1,112 @@
+import uuid
+from datetime import datetime
+from aries_askar import error
+from config import settings
+from app.controllers.askar import AskarController
+from app.status_bitmap import StatusBitmap
+from app.utils import did_from_label, status_list_generate
+from app.validations import ValidationException
+
+# Each tenant has a registry of its status lists, {"active": list_id, "lists": [list_id]}.
+# A list's credential and index bitmap are stored under keys suffixed with its id.
+
+
+def status_list_endpoint(did_label):
+    return f'{settings.HTTPS_BASE}/{settings.DID_NAMESPACE}/{did_label}/credentials/status'
+
+
+def status_list_keys(list_id):
+    return f'statusListCredential:{list_id}', f'statusListEntries:{list_id}'
+
+
+async def create_status_list(did_label, purpose='revocation'):
+    """Stores a new empty status list and returns its id, without activating it."""
+    list_id = str(uuid.uuid4())
+    status_list_credential = {
+        "@context": [
+            "https://www.w3.org/2018/credentials/v1",
+            "https://w3id.org/vc/status-list/2021/v1"
+        ],
+        "id": f'{status_list_endpoint(did_label)}/{list_id}',
+        "issuer": did_from_label(did_label),
+        "issuanceDate": str(datetime.now().isoformat()),
+        "type": ["VerifiableCredential", "StatusList2021Credential"],
+        "credentialSubject": {
+            "type": "StatusList2021",
+            "encodedList": status_list_generate(settings.STATUS_LIST_LENGHT),
+            "statusPurpose": purpose
+        },
+    }
+    credential_key, entries_key = status_list_keys(list_id)
+    await AskarController(did_label).store_many({
+        credential_key: status_list_credential,
+        entries_key: StatusBitmap.new(settings.STATUS_LIST_LENGHT).to_bytes(),
+    })
+    return list_id
+
+
+async def register_status_lists(did_label, purpose='revocation'):
+    list_id = await create_status_list(did_label, purpose)
+    await AskarController(did_label).store('statusLists', {"active": list_id, "lists": [list_id]})
+    return list_id
+
+
+async def rollover_status_list(did_label, full_list_id):
+    """Activates a new list, unless another worker already replaced full_list_id."""
+    askar = AskarController(did_label)
+    list_id = await create_status_list(did_label)
+
+    def activate(registry):
+        if registry["active"] != full_list_id:
+            return registry, False
+        registry["lists"].append(list_id)
+        registry["active"] = list_id
+        return registry, True
+
+    if not await askar.update_atomic('statusLists', activate):
+        for data_key in status_list_keys(list_id):
+            await askar.remove(data_key)
+
+
+async def fetch_status_lists(did_label):
+    registry = (await AskarController(did_label).fetch_many(['statusLists']))['statusLists']
+    return registry if registry else await migrate_status_list(did_label)
+
+
+async def migrate_status_list(did_label):
+    """Registers the single status list of tenants created before lists were sharded."""
+    askar = AskarController(did_label)
+    status_list_credential = (await askar.fetch_many(['statusListCredential']))['statusListCredential']
+    if not status_list_credential:
+        raise ValidationException(
+            status_code=404, content={"message": "Status list not found"}
+        )
+    list_id = status_list_credential['id'].split('/')[-1]
+    registry = {"active": list_id, "lists": [list_id]}
+    credential_key, entries_key = status_list_keys(list_id)
+    try:
+        await askar.store_many({
+            credential_key: status_list_credential,
+            entries_key: await askar.fetch_bytes('statusListEntries'),
+            'statusLists': registry,
+        })
+    except error.AskarError:
+        # Migrated concurrently by another worker
+        return await askar.fetch('statusLists')
+    return registry
+
+
+async def fetch_status_list_credential(did_label, list_id):
+    askar = AskarController(did_label)
+    credential_key = status_list_keys(list_id)[0]
+    try:
+        status_list_credential = (await askar.fetch_many([credential_key]))[credential_key]
+        if not status_list_credential and list_id in (await fetch_status_lists(did_label))["lists"]:
+            status_list_credential = await askar.fetch(credential_key)
+    except error.AskarError:
+        status_list_credential = None
+    if not status_list_credential:
+        raise ValidationException(
+            status_code=404, content={"message": "Status list not found"}
+        )
+    return status_list_credential
@@ -1,35 +1,38 @@
-import requests
+import asyncio
 from config import settings
+from app import http_client
+from app.token_manager import token_manager
 from app.controllers.askar import AskarController
-from app.utils import did_from_label, bitstring_generate, bitstring_expand
+from app.utils import did_from_label, status_list_label, status_list_encode, status_list_decode
+from app.controllers.status_leases import status_leases
+from app.controllers import verifier
+from app.controllers import did_resolver
+from app.controllers.did_document import did_documents
+from app.controllers.status_list_cache import signed_status_lists, remote_status_lists
+from app.controllers.status_lists import (
+    fetch_status_lists,
+    fetch_status_list_credential,
+    register_status_lists,
+    status_list_endpoint,
+    status_list_keys,
+)
 from app.validations import ValidationException
 from datetime import datetime, timedelta
-import uuid
-import random
 
 class TractionController:
-    def __init__(self, did_label):
+    def __init__(self, did_label, askar=None):
         self.did_label = did_label
+        # The request's unit of work when given, reads and writes then share one transaction
+        self.askar = askar or AskarController(did_label)
         self.did = did_from_label(did_label)
         self.endpoint = settings.TRACTION_API_ENDPOINT
         self.tenant_id = settings.TRACTION_TENANT_ID
         self.api_key = settings.TRACTION_API_KEY
-        
-        endpoint = f"{self.endpoint}/multitenancy/tenant/{self.tenant_id}/token"
-        body = {"api_key": self.api_key}
-        r = requests.post(endpoint, json=body)
-        try:
-            token = r.json()["token"]
-            self.headers = {"Authorization": f"Bearer {token}"}
-        except:
-            raise ValidationException(
-                status_code=r.status_code, content={"message": r.text}
-            )
 
-    def verify_token(self, token):
+    async def verify_token(self, token):
         headers = {"Authorization": token}
         endpoint = f"{self.endpoint}/tenant"
-        r = requests.get(endpoint, headers=headers)
+        r = await http_client.get(endpoint, headers=headers)
         try:
             return r.json()
         except:
@@ -42,149 +45,164 @@ class TractionController:
         # Create keypair
         endpoint = f"{self.endpoint}/wallet/did/create"
         body = {"method": did_method, "options": {"key_type": key_type, "did": self.did}}
-        r = requests.post(endpoint, headers=self.headers, json=body)
+        r = await token_manager.post(endpoint, json=body)
         try:
             verkey = r.json()["result"]["verkey"]
             # Provision askar db and store verkey 
             await AskarController(self.did_label).provision()
             await AskarController(self.did_label).store('verkey', verkey)
+            await AskarController().store(f'tenant:{self.did_label}', {"didLabel": self.did_label, "did": self.did})
         except:
             raise ValidationException(
                 status_code=r.status_code, content={"message": r.text}
             )
+        # Serve the new document without a storage read
+        did_documents.publish(self.did_label, verkey)
             
     async def create_status_list(self, purpose='revocation'):
-        status_endpoint = f'{settings.HTTPS_BASE}/{settings.DID_NAMESPACE}/{self.did_label}/credentials/status'
-        status_list_credential = {
-            "@context": [
-                "https://www.w3.org/2018/credentials/v1",
-                "https://w3id.org/vc/status-list/2021/v1"
-            ],
-            "id": f'{status_endpoint}/{uuid.uuid4()}',
-            "issuer": self.did,
-            "issuanceDate": str(datetime.now().isoformat()),
-            "type": ["VerifiableCredential", "StatusList2021Credential"],
-            "credentialSubject": {
-                "type": "StatusList2021",
-                "encodedList": bitstring_generate(str(0) * settings.STATUS_LIST_LENGHT),
-                "statusPurpose": purpose
-            },
-        }
-        status_entries = [0, settings.STATUS_LIST_LENGHT - 1]
-
-        await AskarController(self.did_label).store('statusListCredential', status_list_credential)
-        await AskarController(self.did_label).store('statusListEntries', status_entries)
+        return await register_status_lists(self.did_label, purpose)
             
     async def create_status_entry(self, purpose='revocation'):
-        # https://www.w3.org/TR/vc-bitstring-status-list/#example-example-statuslistcredential
-        status_entries = await AskarController(self.did_label).fetch('statusListEntries')
-        # Find an unoccupied index
-        status_index = random.choice(
-            [
-                e
-                for e in range(settings.STATUS_LIST_LENGHT - 1)
-                if e not in status_entries
-            ]
-        )
-        status_entries.append(status_index)
-        await AskarController(self.did_label).update('statusListEntries', status_entries)
-        status_credential = await AskarController(self.did_label).fetch('statusListCredential')
+        return (await self.create_status_entries(1, purpose))[0]
 
-        credential_status_id = status_credential['id']
-        credential_status = {
-            'id': f'{credential_status_id}#{status_index}',
-            'type': 'StatusList2021Entry',
-            'statusPurpose': purpose,
-            'statusListIndex': status_index,
-            'statusListCredential': status_credential['id']
-        }
-        return credential_status
+    async def create_status_entries(self, count, purpose='revocation'):
+        # https://www.w3.org/TR/vc-bitstring-status-list/#example-example-statuslistcredential
+        # Unoccupied indexes from this worker's leased block
+        credential_statuses = []
+        for list_id, status_index in await status_leases.next_indexes(self.did_label, count):
+            status_list_id = f'{status_list_endpoint(self.did_label)}/{list_id}'
+            credential_statuses.append({
+                'id': f'{status_list_id}#{status_index}',
+                'type': 'StatusList2021Entry',
+                'statusPurpose': purpose,
+                'statusListIndex': status_index,
+                'statusListCredential': status_list_id
+            })
+        return credential_statuses
     
-    async def get_status_list_credential(self):
-        try:
-            status_list_credential = await AskarController(self.did_label).fetch('statusListCredential')
-            status_list_credential['expirationDate'] = str((datetime.now()+timedelta(minutes=5)).isoformat())
-            status_list_vc = await self.sign_json_ld(status_list_credential)
-            return status_list_vc
-        except:
-            return ValidationException(
-                status_code=404,
-                content={"message": "Status list not found"},
-            )
+    async def get_status_list_credential(self, list_id):
+        status_list_credential = await fetch_status_list_credential(self.did_label, list_id)
+        return await signed_status_lists.get(status_list_credential, self.sign_status_list_credential)
 
+    async def sign_status_list_credential(self, status_list_credential):
+        expiration_date = datetime.now() + timedelta(seconds=settings.STATUS_LIST_TTL)
+        status_list_credential['expirationDate'] = str(expiration_date.isoformat())
+        return await self.sign_json_ld(status_list_credential)
 
-    def get_credential_status(self, vc):
+    async def get_credential_status(self, vc, status_lists=None):
         # https://www.w3.org/TR/vc-bitstring-status-list/#validate-algorithm
         status_index = vc["credentialStatus"]["statusListIndex"]
         status_list_endpoint = vc["credentialStatus"]["statusListCredential"]
 
-        r = requests.get(status_list_endpoint)
-        status_list_vc = r.json()
-        status_list_bitstring = bitstring_expand(
-            status_list_vc["credentialSubject"]["encodedList"]
-        )
-        status_list = list(status_list_bitstring)
-        status_bit = status_list[status_index]
-        return True if status_bit == "1" else False
+        if status_lists is None:
+            status_list = await self.fetch_status_list(status_list_endpoint)
+        else:
+            # Credentials verified together share each status list lookup
+            if status_list_endpoint not in status_lists:
+                status_lists[status_list_endpoint] = asyncio.ensure_future(
+                    self.fetch_status_list(status_list_endpoint)
+                )
+            status_list = await asyncio.shield(status_lists[status_list_endpoint])
+        return bool(status_list[status_index])
 
+    async def fetch_status_list(self, status_list_endpoint):
+        did_label = status_list_label(status_list_endpoint)
+        if did_label:
+            # Our own list, read the stored state instead of requesting a signed copy
+            return await self.fetch_local_status_list(did_label, status_list_endpoint)
+        return await remote_status_lists.get(status_list_endpoint)
+
+    async def fetch_local_status_list(self, did_label, status_list_id):
+        status_list_credential = await fetch_status_list_credential(did_label, status_list_id.split('/')[-1])
+        if status_list_credential['id'] != status_list_id:
+            raise ValidationException(
+                status_code=404,
+                content={"message": "Status list not found"},
+            )
+        return status_list_decode(status_list_credential["credentialSubject"]["encodedList"])
 
     async def change_credential_status(self, credential_id, status):
-        vc = await AskarController(self.did_label).fetch(f'credentials:{credential_id}')
-        status_index = vc["credentialStatus"]["statusListIndex"]
-        status_bit = status[0]["status"]
-        status_list_credential = await AskarController(self.did_label).fetch('statusListCredential')
-        status_list_encoded = status_list_credential["credentialSubject"]["encodedList"]
-        status_list_bitstring = bitstring_expand(status_list_encoded)
-        status_list = list(status_list_bitstring)
+        result = (await self.change_credentials_status(
+            [{"credentialId": credential_id, "credentialStatus": status}]
+        ))[0]
+        if result["statusCode"] != 200:
+            raise ValidationException(
+                status_code=result["statusCode"], content={"message": result["message"]}
+            )
 
-        status_list[status_index] = status_bit
-        status_list_bitstring = "".join(status_list)
-        status_list_encoded = bitstring_generate(status_list_bitstring)
+    async def change_credentials_status(self, updates):
+        askar = self.askar
+        # Read before askar's first use, a unit of work then holds the only
+        # connection of the request. This also registers the lists of tenants
+        # created before sharding.
+        try:
+            list_ids = (await fetch_status_lists(self.did_label))["lists"]
+        except ValidationException:
+            list_ids = []
+        credentials = await askar.fetch_many(
+            [f'credentials:{update["credentialId"]}' for update in updates]
+        )
+        results = []
+        # Bit changes grouped per status list, so each list is written once
+        changes = {}
+        for update in updates:
+            credential_id = update["credentialId"]
+            vc = credentials[f'credentials:{credential_id}']
+            if not vc or "credentialStatus" not in vc:
+                results.append({
+                    "credentialId": credential_id,
+                    "statusCode": 404,
+                    "message": f"credential {credential_id} not found",
+                })
+                continue
+            status_list_id = vc["credentialStatus"]["statusListCredential"]
+            status_index = vc["credentialStatus"]["statusListIndex"]
+            changes.setdefault(status_list_id, {})[status_index] = int(update["credentialStatus"][0]["status"])
+            results.append({"credentialId": credential_id, "status_list_id": status_list_id})
 
-        status_list_credential["credentialSubject"]["encodedList"] = status_list_encoded
-        
-        await AskarController(self.did_label).update('statusListCredential', status_list_credential)
+        failed = set()
+        for status_list_id, bits in changes.items():
+            list_id = status_list_id.split('/')[-1]
+            if list_id not in list_ids:
+                failed.add(status_list_id)
+                continue
+
+            def apply(status_list_credential):
+                if status_list_credential["id"] != status_list_id:
+                    raise ValidationException(
+                        status_code=404, content={"message": "Status list not found"}
+                    )
+                status_list = status_list_decode(status_list_credential["credentialSubject"]["encodedList"])
+                for status_index, status_bit in bits.items():
+                    status_list[status_index] = status_bit
+                status_list_credential["credentialSubject"]["encodedList"] = status_list_encode(status_list)
+                return status_list_credential, None
+
+            try:
+                await askar.update_atomic(status_list_keys(list_id)[0], apply)
+            except ValidationException:
+                failed.add(status_list_id)
 
-    def resolve_did(self, did):
+        for result in results:
+            status_list_id = result.pop("status_list_id", None)
+            if status_list_id in failed:
+                result["statusCode"] = 404
+                result["message"] = "Status list not found"
+            elif status_list_id:
+                result["statusCode"] = 200
+                result["message"] = "Status updated"
+        return results
+
+    async def resolve_did(self, did):
         # TODO, improve did validation
         if did[:9] == "urn:uuid:":
             raise ValidationException(status_code=404, content={"message": "Not found"})
         if "did:" not in did:
             raise ValidationException(status_code=400, content={"message": "Invalid DID"})
-
-        endpoint = f"{settings.VERIFIER_ENDPOINT}/resolver/resolve/{did}"
-        r = requests.get(endpoint)
-        try:
-            return r.json()["did_document"]
-        except:
-            raise ValidationException(
-                status_code=r.status_code, content={"message": r.text}
-            )
+        return await did_resolver.resolve_did(did)
 
     async def fetch_did_document(self):
-        verkey = await AskarController(self.did_label).fetch('verkey')
-        service_endpoint = f'{settings.HTTPS_BASE}/{settings.DID_NAMESPACE}/{self.did_label}'
-        return {
-            '@context': [
-                "https://www.w3.org/ns/did/v1",
-                "https://w3id.org/security/v2",
-                "https://w3id.org/traceability/v1"
-            ],
-            'id': self.did,
-            'verificationMethod': [{
-                'id': f'{self.did}#verkey',
-                'type': 'Ed25519VerificationKey2018',
-                'controller': self.did,
-                'publicKeyBase58': verkey
-            }],
-            'authentication': [ f'{self.did}#verkey'],
-            'assertionMethod': [ f'{self.did}#verkey'],
-            'service': [{
-                'id': f'{self.did}#traceability-api',
-                'type': ["TraceabilityAPI"],
-                'serviceEndpoint': service_endpoint
-            }]
-        }
+        return await did_resolver.local_did_document(self.did_label)
 
     async def sign_json_ld(self, credential):
         options = {
@@ -192,10 +210,14 @@ class TractionController:
             'proofPurpose': 'assertionMethod',
             'verificationMethod': f'{self.did}#verkey'
         }
-        verkey = await AskarController(self.did_label).fetch('verkey')
+        verkey = (await did_documents.get(self.did_label)).verkey
         body = {"doc": {"credential": credential, "options": options}, "verkey": verkey}
         endpoint = f"{self.endpoint}/jsonld/sign"
-        r = requests.post(endpoint, headers=self.headers, json=body)
+        r = await token_manager.post(
+            endpoint,
+            json=body,
+            timeout=settings.TRACTION_SIGN_TIMEOUT,
+        )
         try:
             return r.json()["signed_doc"]
         except:
@@ -203,10 +225,14 @@ class TractionController:
                 status_code=r.status_code, content={"message": r.text}
             )
 
-    def issue_credential(self, credential, options):
+    async def issue_credential(self, credential, options):
         endpoint = f"{self.endpoint}/vc/credentials/issue"
         body = {"credential": credential, "options": options}
-        r = requests.post(endpoint, headers=self.headers, json=body)
+        r = await token_manager.post(
+            endpoint,
+            json=body,
+            timeout=settings.TRACTION_SIGN_TIMEOUT,
+        )
         try:
             return r.json()["vc"]
         except:
@@ -215,25 +241,40 @@ class TractionController:
             )
 
 
-    def verify_credential(self, vc):
-        endpoint = f"{settings.VERIFIER_ENDPOINT}/vc/credentials/verify"
-        body = {"verifiableCredential": vc, "options": {}}
-        r = requests.post(endpoint, json=body)
+    async def verify_credentials(self, vcs):
+        """Verifies credentials concurrently, returns one result per credential."""
+        semaphore = asyncio.Semaphore(settings.VERIFICATION_CONCURRENCY)
+        status_lists = {}
+
+        async def verify(vc):
+            async with semaphore:
+                try:
+                    verifications = await self.verify_credential(vc, status_lists)
+                except ValidationException as e:
+                    message = e.content.get('message') if isinstance(e.content, dict) else e.content
+                    verifications = {'verified': False, 'checks': [], 'errors': [message]}
+                except Exception as e:
+                    # A malformed credential fails alone, not the whole batch
+                    verifications = {'verified': False, 'checks': [], 'errors': [f'Invalid credential: {e!r}']}
+            return {'id': vc.get('id'), **verifications}
+
         try:
-            verifications = r.json()
-        except:
-            raise ValidationException(
-                status_code=r.status_code, content={"message": r.text}
-            )
-            
-        verifications.pop('document')
-        verifications.pop('results')
+            return await asyncio.gather(*[verify(vc) for vc in vcs])
+        finally:
+            for task in status_lists.values():
+                if task.done() and not task.cancelled():
+                    task.exception()
+
+    async def verify_credential(self, vc, status_lists=None):
+        if verifier.supported(vc):
+            verifications = {'errors': await verifier.verify_proof(vc, self.resolve_did)}
+        else:
+            verifications = await self.verify_credential_proof(vc)
         verifications['checks'] = ['proof']
-        verifications['errors'] = [verifications['errors']] if 'errors' in verifications else []
         verifications['verified'] = True if len(verifications['errors']) == 0 else False
         
         if "credentialStatus" in vc:
-            if self.get_credential_status(vc):
+            if await self.get_credential_status(vc, status_lists):
                 verifications['verified'] = False
                 verifications['errors'].append('status')
             verifications['checks'].append('status')
@@ -252,10 +293,31 @@ class TractionController:
             
         return verifications
 
-    def verify_presentation(self, vp):
-        body = {"verifiablePresentation": vp, "options": {}}
+    async def verify_credential_proof(self, vc):
+        endpoint = f"{settings.VERIFIER_ENDPOINT}/vc/credentials/verify"
+        body = {"verifiableCredential": vc, "options": {}}
+        r = await http_client.post(endpoint, json=body, timeout=settings.VERIFIER_TIMEOUT)
+        try:
+            verifications = r.json()
+        except:
+            raise ValidationException(
+                status_code=r.status_code, content={"message": r.text}
+            )
+            
+        verifications.pop('document')
+        verifications.pop('results')
+        verifications['errors'] = [verifications['errors']] if 'errors' in verifications else []
+        return verifications
+
+    async def verify_presentation(self, vp, options=None):
+        options = options or {}
+        if verifier.supported(vp) and all(
+            verifier.supported(vc) for vc in vp.get("verifiableCredential", [])
+        ):
+            return await verifier.verify_presentation(vp, self.resolve_did, options)
+        body = {"verifiablePresentation": vp, "options": options}
         endpoint = f"{settings.VERIFIER_ENDPOINT}/vc/presentations/verify"
-        r = requests.post(endpoint, json=body)
+        r = await http_client.post(endpoint, json=body, timeout=settings.VERIFIER_TIMEOUT)
         try:
             return r.json()
         except:
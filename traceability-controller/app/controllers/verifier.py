@@ -0,0 +1,185 @@
+import asyncio
+import base64
+import hashlib
+import json
+import base58
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from pyld import jsonld
+from config import settings
+from app.document_loader import document_loader
+from app.validations import ValidationException
+
+# Proof suites verified in process, others are sent to the verifier agent
+SUPPORTED_PROOF_TYPES = ["Ed25519Signature2018"]
+
+
+class ProofError(Exception):
+    pass
+
+
+def supported(document):
+    proof = document.get("proof")
+    return (
+        settings.LOCAL_VERIFICATION
+        and isinstance(proof, dict)
+        and proof.get("type") in SUPPORTED_PROOF_TYPES
+    )
+
+
+def b64url_decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def canonize(document):
+    return jsonld.normalize(
+        document,
+        {
+            "algorithm": "URDNA2015",
+            "format": "application/n-quads",
+            "documentLoader": document_loader,
+        },
+    )
+
+
+def public_key_bytes(verification_method):
+    if "publicKeyBase58" in verification_method:
+        return base58.b58decode(verification_method["publicKeyBase58"])
+    if "publicKeyMultibase" in verification_method:
+        public_key = base58.b58decode(verification_method["publicKeyMultibase"][1:])
+        # Strip the ed25519-pub multicodec prefix
+        return public_key[2:] if public_key[:2] == b"\xed\x01" else public_key
+    if "publicKeyJwk" in verification_method:
+        return b64url_decode(verification_method["publicKeyJwk"]["x"])
+    raise ProofError("Unsupported verification method")
+
+
+def verify_signature(document, public_key):
+    # https://w3c-ccg.github.io/lds-ed25519-2018/
+    document = dict(document)
+    proof = dict(document.pop("proof"))
+    jws = proof.pop("jws", "")
+    proof.pop("signatureValue", None)
+    proof.pop("proofValue", None)
+    if "@context" not in document:
+        raise ProofError("Missing @context")
+    proof["@context"] = document["@context"]
+
+    verify_data = (
+        hashlib.sha256(canonize(proof).encode()).digest()
+        + hashlib.sha256(canonize(document).encode()).digest()
+    )
+    try:
+        header, _, signature = jws.split(".")
+        jws_header = json.loads(b64url_decode(header))
+    except ValueError:
+        raise ProofError("Invalid jws")
+    if jws_header.get("alg") != "EdDSA" or jws_header.get("b64") is not False:
+        raise ProofError("Unsupported jws header")
+    try:
+        Ed25519PublicKey.from_public_bytes(public_key).verify(
+            b64url_decode(signature), header.encode() + b"." + verify_data
+        )
+    except (InvalidSignature, ValueError):
+        raise ProofError("Invalid signature")
+
+
+async def fetch_verification_method(verification_method_id, proof_purpose, resolve_did):
+    did = verification_method_id.split("#")[0]
+    did_document = await resolve_did(did)
+
+    def absolute(method_id):
+        return f"{did}{method_id}" if method_id.startswith("#") else method_id
+
+    verification_methods = {
+        absolute(method["id"]): method
+        for method in did_document.get("verificationMethod", [])
+    }
+    authorized = []
+    for method in did_document.get(proof_purpose, []):
+        if isinstance(method, dict):
+            verification_methods[absolute(method["id"])] = method
+            method = method["id"]
+        authorized.append(absolute(method))
+
+    if verification_method_id not in authorized:
+        raise ProofError(f"Verification method not authorized for {proof_purpose}")
+    if verification_method_id not in verification_methods:
+        raise ProofError("Verification method not found")
+    return verification_methods[verification_method_id]
+
+
+def proof_controller(document, proof_purpose):
+    """The DID a proof must be made by, the issuer of a credential or the holder of a presentation."""
+    controller = document.get("issuer" if proof_purpose == "assertionMethod" else "holder")
+    controller = controller.get("id") if isinstance(controller, dict) else controller
+    if proof_purpose == "assertionMethod" and not controller:
+        raise ProofError("Missing issuer")
+    return controller
+
+
+def check_challenge(proof, options):
+    # Replayed presentations are rejected, the same as the verifier agent does
+    if not options.get("challenge"):
+        raise ProofError("A challenge is required to verify a presentation")
+    if proof.get("challenge") != options["challenge"]:
+        raise ProofError("Invalid challenge")
+    if options.get("domain") and proof.get("domain") != options["domain"]:
+        raise ProofError("Invalid domain")
+
+
+async def verify_proof(document, resolve_did, proof_purpose="assertionMethod", options=None):
+    """Verifies a document's proof, returns a list of errors."""
+    proof = document["proof"]
+    try:
+        if proof.get("proofPurpose") != proof_purpose:
+            raise ProofError(f"Proof purpose must be {proof_purpose}")
+        if proof_purpose == "authentication":
+            check_challenge(proof, options or {})
+        controller = proof_controller(document, proof_purpose)
+        if controller and proof["verificationMethod"].split("#")[0] != controller:
+            raise ProofError(f"Verification method is not controlled by {controller}")
+        verification_method = await fetch_verification_method(
+            proof["verificationMethod"], proof_purpose, resolve_did
+        )
+        # Canonicalization is cpu bound, keep it off the event loop
+        await asyncio.to_thread(
+            verify_signature, document, public_key_bytes(verification_method)
+        )
+    except ProofError as e:
+        return [str(e)]
+    except ValidationException as e:
+        # An unresolvable verification method fails the proof, not the request
+        message = e.content.get("message") if isinstance(e.content, dict) else None
+        return [f"DID resolution failed: {message or e.status_code}"]
+    except (KeyError, TypeError, ValueError) as e:
+        return [f"Malformed proof: {e!r}"]
+    except jsonld.JsonLdError as e:
+        return [f"Canonicalization failed: {e.type}"]
+    return []
+
+
+async def verify_presentation(vp, resolve_did, options=None):
+    presentation_errors = await verify_proof(vp, resolve_did, "authentication", options)
+    semaphore = asyncio.Semaphore(settings.VERIFICATION_CONCURRENCY)
+
+    async def verify_credential(vc):
+        async with semaphore:
+            errors = await verify_proof(vc, resolve_did)
+        return {"verified": not errors, "errors": errors}
+
+    credential_results = await asyncio.gather(
+        *[verify_credential(vc) for vc in vp.get("verifiableCredential", [])]
+    )
+    errors = presentation_errors + [
+        error for result in credential_results for error in result["errors"]
+    ]
+    return {
+        "verified": not errors,
+        "presentation_result": {
+            "verified": not presentation_errors,
+            "errors": presentation_errors,
+        },
+        "credential_results": credential_results,
+        "errors": errors,
+    }
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from cachetools import TTLCache
+from pyld import jsonld
+from config import settings
+
+# Contexts used by the credentials and DID documents this controller handles,
+# served from the bundled copies in app/contexts
+BUNDLED_CONTEXTS = {
+    "https://www.w3.org/2018/credentials/v1": "credentials-v1.jsonld",
+    "https://w3id.org/vc/status-list/2021/v1": "status-list-2021-v1.jsonld",
+    "https://www.w3.org/ns/did/v1": "did-v1.jsonld",
+    "https://w3id.org/security/v1": "security-v1.jsonld",
+    "https://w3id.org/security/v2": "security-v2.jsonld",
+    "https://w3id.org/security/suites/ed25519-2020/v1": "ed25519-2020-v1.jsonld",
+}
+CONTEXTS_DIR = os.path.join(os.path.dirname(__file__), "contexts")
+
+
+class DocumentLoader:
+    """PyLD document loader serving bundled contexts from memory.
+
+    Other documents are fetched once and kept in a bounded TTL cache, or rejected
+    when JSONLD_OFFLINE is set. Canonicalization runs in worker threads so the
+    cache is guarded by a lock.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        for url, filename in BUNDLED_CONTEXTS.items():
+            with open(os.path.join(CONTEXTS_DIR, filename)) as context:
+                self.documents[url] = self.remote_document(url, json.load(context))
+        self.cache = TTLCache(
+            maxsize=settings.JSONLD_CACHE_SIZE, ttl=settings.JSONLD_CACHE_TTL
+        )
+        self.lock = threading.Lock()
+        self.fetch = jsonld.requests_document_loader(timeout=settings.HTTP_TIMEOUT)
+
+    @staticmethod
+    def remote_document(url, document):
+        return {"contextUrl": None, "documentUrl": url, "document": document}
+
+    def __call__(self, url, options=None):
+        if url in self.documents:
+            return self.documents[url]
+        with self.lock:
+            document = self.cache.get(url)
+        if document:
+            return document
+        if settings.JSONLD_OFFLINE:
+            raise jsonld.JsonLdError(
+                f"Unknown context {url}, remote contexts are disabled",
+                "jsonld.LoadDocumentError",
+                code="loading document failed",
+            )
+        document = self.fetch(url, options or {})
+        with self.lock:
+            self.cache[url] = document
+        return document
+
+
+document_loader = DocumentLoader()
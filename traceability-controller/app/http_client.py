@@ -0,0 +1,59 @@
+import httpx
+from config import settings
+from app.validations import ValidationException
+
+# One pooled client per worker process, shared by every upstream call
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_POOL_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+            ),
+            # Same as requests, did:web hosts and status lists may redirect
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def request(method, url, timeout=None, **kwargs):
+    """Send a request through the shared client.
+
+    A per-call timeout in seconds overrides the pool default. Transport errors are
+    surfaced as ValidationException so callers keep their existing error handling.
+    """
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    try:
+        return await get_client().request(method, url, **kwargs)
+    except httpx.TimeoutException:
+        raise ValidationException(
+            status_code=504, content={"message": f"Upstream timeout: {url}"}
+        )
+    except httpx.HTTPError as e:
+        raise ValidationException(
+            status_code=502, content={"message": f"Upstream error: {e}"}
+        )
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
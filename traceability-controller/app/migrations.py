@@ -0,0 +1,87 @@
+"""Storage migrations.
+
+python -m app.migrations retag [did_label ...]
+    Rewrite the tags of every record in the default store and in each tenant
+    store. Tenants created before the tenant registry existed are registered
+    when their label is given.
+
+python -m app.migrations profiles [did_label ...]
+    Copy each tenant database into a profile of the default database, for
+    ASKAR_PROFILES. Records already copied are overwritten so the migration can
+    be run again, the tenant databases are left in place.
+"""
+import asyncio
+import sys
+from aries_askar import error
+from app.controllers.askar import AskarController, merge_tags, store_registry, tenant_labels
+from app.utils import did_from_label
+
+
+async def register_tenants(did_labels):
+    known = await tenant_labels()
+    for did_label in did_labels:
+        if did_label not in known:
+            await AskarController().store(
+                f"tenant:{did_label}",
+                {"didLabel": did_label, "did": did_from_label(did_label)},
+            )
+
+
+async def retag(did_labels):
+    await register_tenants(did_labels)
+    print(f"default: {await AskarController().retag()} records")
+    for did_label in await tenant_labels():
+        try:
+            print(f"{did_label}: {await AskarController(did_label).retag()} records")
+        except error.AskarError as e:
+            print(f"{did_label}: {str(e)}")
+
+
+async def copy_to_profile(did_label, batch_size=500):
+    source = AskarController(did_label, profiles=False)
+    target = AskarController(did_label, profiles=True)
+    await target.provision()
+    copied = 0
+    async with source.lease() as source_store, target.lease() as target_store:
+        while True:
+            entries = await source_store.scan(
+                "seq", offset=copied, limit=batch_size
+            ).fetch_all()
+            if not entries:
+                return copied
+            async with target_store.transaction(target.profile) as txn:
+                for entry in entries:
+                    tags = merge_tags(entry.tags)
+                    if await txn.fetch("seq", entry.name, for_update=True):
+                        await txn.replace("seq", entry.name, entry.value, tags)
+                    else:
+                        await txn.insert("seq", entry.name, entry.value, tags)
+                await txn.commit()
+            copied += len(entries)
+
+
+async def profiles(did_labels):
+    await register_tenants(did_labels)
+    for did_label in await tenant_labels():
+        try:
+            print(f"{did_label}: {await copy_to_profile(did_label)} records")
+        except error.AskarError as e:
+            print(f"{did_label}: {str(e)}")
+        # Only the default database stays open
+        await store_registry.close(AskarController(did_label, profiles=False).db)
+
+
+async def main(command, args):
+    try:
+        if command == "retag":
+            await retag(args)
+        elif command == "profiles":
+            await profiles(args)
+        else:
+            print(__doc__)
+    finally:
+        await store_registry.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None, sys.argv[2:]))
@@ -6,6 +6,7 @@ from .credentials import (
 )
 from typing import List
 from pydantic import BaseModel, Field, field_validator
+from config import settings
 import re, uuid
 
 CHECK_RE = re.compile("[a-z0-9_-]+$")
@@ -27,6 +28,23 @@ class IssueCredentialSchema(BaseModel):
     options: IssuanceOptions
 
 
+class BatchIssueCredentialSchema(BaseModel):
+    credentials: List[Credential] = Field()
+    options: IssuanceOptions
+
+    @field_validator("credentials")
+    @classmethod
+    def validate_credentials(cls, value):
+        if len(value) < 1:
+            raise ValueError("Must have items")
+        if len(value) > settings.BATCH_MAX_SIZE:
+            raise ValueError(f"Maximum of {settings.BATCH_MAX_SIZE} items")
+        ids = [credential.id for credential in value if credential.id]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Duplicate credential id")
+        return value
+
+
 class VerifyCredentialSchema(BaseModel):
     verifiableCredential: VerifiableCredential
 
@@ -43,6 +61,19 @@ class UpdateCredentialStatusSchema(BaseModel):
         return value
 
 
+class BatchUpdateCredentialStatusSchema(BaseModel):
+    updates: List[UpdateCredentialStatusSchema] = Field()
+
+    @field_validator("updates")
+    @classmethod
+    def validate_updates(cls, value):
+        if len(value) < 1:
+            raise ValueError("Must have items")
+        if len(value) > settings.BATCH_MAX_SIZE:
+            raise ValueError(f"Maximum of {settings.BATCH_MAX_SIZE} items")
+        return value
+
+
 class CredentialVerificationResponse(BaseModel):
     checks: List[str] = []
     errors: List[str] = []
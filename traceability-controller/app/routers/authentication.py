@@ -1,10 +1,7 @@
 from fastapi import APIRouter, Form
 from fastapi.responses import JSONResponse
 from typing import Annotated
-from config import settings
 from app.controllers import auth
-import time
-import jwt
 
 router = APIRouter()
 
@@ -14,8 +11,6 @@ async def oauth(
     client_id: Annotated[str, Form()], client_secret: Annotated[str, Form()]
 ):
     await auth.verify_client_hash(client_id, client_secret)
-    expires_in = 600
-    payload = {"client_id": client_id, "expires": int(time.time()) + expires_in}
-    token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    token, expires_in = auth.issue_token(client_id)
     response = {"access_token": token, "token_type": "Bearer", "expires_in": expires_in}
     return JSONResponse(status_code=200, content=response)
@@ -1,29 +1,151 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from aries_askar import error
 from config import settings
 from app.controllers.traction import TractionController
-from app.controllers.askar import AskarController
+from app.controllers.askar import AskarController, AskarUnitOfWork, unit_of_work, sequence_tag
 from app.controllers import auth
 from app.models.web_requests import (
     IssueCredentialSchema,
+    BatchIssueCredentialSchema,
     UpdateCredentialStatusSchema,
+    BatchUpdateCredentialStatusSchema,
     VerifyCredentialSchema,
 )
 from app.auth.bearer import JWTBearer
+from app.validations import ValidationException
+import asyncio
+import base64
+import json
 import uuid
 
 router = APIRouter()
 
 
+@router.get(
+    "/{did_label}/credentials",
+    tags=["Credentials"],
+    dependencies=[Depends(JWTBearer())],
+    summary="List issued credentials, filtered by type, issuer, status list or issuance date.",
+)
+async def list_credentials(
+    did_label: str,
+    request: Request,
+    type: str = None,
+    issuer: str = None,
+    statusListId: str = None,
+    issuedFrom: str = None,
+    issuedUntil: str = None,
+    limit: int = Query(settings.CREDENTIALS_PAGE_SIZE, ge=1, le=settings.CREDENTIALS_MAX_PAGE_SIZE),
+    cursor: str = None,
+    stream: bool = False,
+):
+    await auth.is_authorized(did_label, request)
+    tag_filter = credential_filter(type, issuer, statusListId, issuedFrom, issuedUntil)
+    askar = AskarController(did_label)
+    after = decode_cursor(cursor)
+
+    if stream:
+        # One line per credential as it comes off the scan, unordered, the cursor sets the start
+        async def rows():
+            async for data_key, credential in askar.scan(sequence_filter(tag_filter, after)):
+                yield json.dumps(credential) + "\n"
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    credentials, after = await credentials_page(askar, tag_filter, after, limit)
+    response = {
+        "credentials": credentials,
+        "next": encode_cursor(after) if after is not None else None,
+    }
+    return JSONResponse(status_code=200, content=response)
+
+
+async def credentials_page(askar, tag_filter, after, limit):
+    """The first limit credentials numbered after a sequence number, and the last number of the page.
+
+    Scans are unordered, so the page is read from a range of sequence numbers
+    holding between limit + 1 and 2 * limit + 1 matches, or all of the
+    remaining ones, and sorted. The last number is None on the last page.
+    """
+    last = await askar.sequence()
+    low, high = after, min(after + limit + 1, last)
+    matches = await askar.count(sequence_filter(tag_filter, after, high))
+    # Double the range until it holds more than a page or reaches the last number
+    while matches <= limit and high < last:
+        low, high = high, min(2 * high - after, last)
+        matches = await askar.count(sequence_filter(tag_filter, after, high))
+    # Halve it back while it holds more than two pages
+    while matches > 2 * limit + 1:
+        middle = (low + high) // 2
+        middle_matches = await askar.count(sequence_filter(tag_filter, after, middle))
+        if middle_matches > limit:
+            high, matches = middle, middle_matches
+        else:
+            low = middle
+    records = await askar.find_sequenced(sequence_filter(tag_filter, after, high))
+    page = records[:limit]
+    return [credential for number, credential in page], page[-1][0] if len(records) > limit else None
+
+
+def sequence_filter(tag_filter, after, until=None):
+    bounds = [{"~seq": {"$gt": sequence_tag(after)}}]
+    if until is not None:
+        bounds.append({"~seq": {"$lte": sequence_tag(until)}})
+    return {"$and": [tag_filter, *bounds]}
+
+
+def credential_filter(credential_type, issuer, status_list_id, issued_from, issued_until):
+    tag_filter = [{"kind": "credentials"}]
+    if credential_type:
+        tag_filter.append({"type": credential_type})
+    if issuer:
+        tag_filter.append({"issuer": issuer})
+    if status_list_id:
+        tag_filter.append({"statusListId": status_list_id})
+    # Issuance dates are tagged by day, both bounds are inclusive
+    if issued_from:
+        tag_filter.append({"~issued": {"$gte": issued_from[:10]}})
+    if issued_until:
+        tag_filter.append({"~issued": {"$lte": issued_until[:10]}})
+    return {"$and": tag_filter}
+
+
+def encode_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps({"after": after}).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor))["after"]
+        if isinstance(after, int) and after >= 0:
+            return after
+    except:
+        pass
+    raise ValidationException(status_code=400, content={"message": "Invalid cursor"})
+
+
 @router.get(
     "/{did_label}/credentials/{credential_id}",
     tags=["Credentials"],
     dependencies=[Depends(JWTBearer())],
     summary="Get a verifiable credential by id. Required to make revocable credentials.",
 )
-async def get_credential(did_label: str, credential_id: str, request: Request):
+async def get_credential(
+    did_label: str,
+    credential_id: str,
+    request: Request,
+    askar: AskarUnitOfWork = Depends(unit_of_work),
+):
     await auth.is_authorized(did_label, request)
-    credential = await AskarController(did_label).fetch(f'credentials:{credential_id}')
+    credential = await askar.fetch(f'credentials:{credential_id}')
+    if not credential:
+        raise ValidationException(
+            status_code=404,
+            content={"message": f"credential {credential_id} not found"},
+        )
     return JSONResponse(status_code=200, content=credential)
 
 
@@ -34,7 +156,10 @@ async def get_credential(did_label: str, credential_id: str, request: Request):
     summary="Issue a credential",
 )
 async def issue_credential(
-    did_label: str, request: Request, request_body: IssueCredentialSchema
+    did_label: str,
+    request: Request,
+    request_body: IssueCredentialSchema,
+    askar: AskarUnitOfWork = Depends(unit_of_work),
 ):
     await auth.is_authorized(did_label, request)
 
@@ -45,25 +170,116 @@ async def issue_credential(
     # Ensure the issuer field in the credential has the right value
     auth.can_issue(credential, did_label)
     
+    traction = TractionController(did_label, askar)
+    prepare_credential(credential, await traction.create_status_entry())
+
+    # TODO use new issuance endpoint
+    vc = await traction.sign_json_ld(credential)
+    # if 'created' in options:
+    #     vc['proof']['created'] = options['created']
+
+    credential_id = credential["id"]
+    await askar.store(f'credentials:{credential_id}', vc)
+    await askar.commit()
+
+    return JSONResponse(status_code=201, content={"verifiableCredential": vc})
+
+
+@router.post(
+    "/{did_label}/credentials/issue/batch",
+    tags=["Credentials"],
+    dependencies=[Depends(JWTBearer())],
+    summary="Issue many credentials, results are streamed back as newline delimited json",
+)
+async def issue_credentials(
+    did_label: str, request: Request, request_body: BatchIssueCredentialSchema
+):
+    await auth.is_authorized(did_label, request)
+
+    request_body = request_body.model_dump(by_alias=True, exclude_none=True)
+    credentials = request_body["credentials"]
+
+    # Validate the whole batch before reserving status entries
+    for credential in credentials:
+        auth.can_issue(credential, did_label)
+
     traction = TractionController(did_label)
-    
+    credential_statuses = await traction.create_status_entries(len(credentials))
+    for credential, credential_status in zip(credentials, credential_statuses):
+        prepare_credential(credential, credential_status)
+
+    return StreamingResponse(
+        issue_batch(traction, credentials), media_type="application/x-ndjson"
+    )
+
+
+def prepare_credential(credential, credential_status):
     # Generate a credential id if none is provided
     if "id" not in credential:
         credential["id"] = f"urn:uuid:{str(uuid.uuid4())}"
 
     # Fill status information
     credential['@context'].append('https://w3id.org/vc/status-list/2021/v1')
-    credential['credentialStatus'] = await traction.create_status_entry()
+    credential['credentialStatus'] = credential_status
 
-    # TODO use new issuance endpoint
-    vc = await traction.sign_json_ld(credential)
-    # if 'created' in options:
-    #     vc['proof']['created'] = options['created']
 
-    credential_id = credential["id"]
-    await AskarController(did_label).store(f'credentials:{credential_id}', vc)
+async def issue_batch(traction, credentials):
+    """Signs credentials concurrently, yielding a line per credential as it's signed.
 
-    return JSONResponse(status_code=201, content={"verifiableCredential": vc})
+    Credentials signed at the same time are stored in one transaction before
+    their lines are sent, so every credential returned to the client has a
+    record, the last line reports how many were stored.
+    """
+    semaphore = asyncio.Semaphore(settings.ISSUANCE_CONCURRENCY)
+    askar = AskarController(traction.did_label)
+
+    async def sign(index, credential):
+        async with semaphore:
+            try:
+                return index, await traction.sign_json_ld(credential), None
+            except ValidationException as exception:
+                return index, None, exception
+
+    pending = {
+        asyncio.create_task(sign(index, credential))
+        for index, credential in enumerate(credentials)
+    }
+    stored = 0
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            signed = [task.result() for task in done]
+            issued = {
+                f'credentials:{credentials[index]["id"]}': vc
+                for index, vc, exception in signed
+                if vc
+            }
+            message = None
+            if issued:
+                try:
+                    await askar.store_many(issued)
+                    stored += len(issued)
+                except error.AskarError as exception:
+                    message = str(exception)
+            for index, vc, exception in signed:
+                credential_id = credentials[index]["id"]
+                if vc and not message:
+                    result = {"index": index, "credentialId": credential_id, "verifiableCredential": vc}
+                elif vc:
+                    result = {"index": index, "credentialId": credential_id, "statusCode": 500, "message": message}
+                else:
+                    result = {
+                        "index": index,
+                        "credentialId": credential_id,
+                        "statusCode": exception.status_code,
+                        "message": exception.content.get("message"),
+                    }
+                yield json.dumps(result) + "\n"
+        yield json.dumps({"stored": stored}) + "\n"
+    finally:
+        # The client went away, credentials not yet signed are dropped
+        for task in pending:
+            task.cancel()
 
 
 @router.post(
@@ -79,7 +295,7 @@ async def verify_credential(
 
     request_body = request_body.model_dump(by_alias=True, exclude_none=True)
     vc = request_body["verifiableCredential"]
-    verifications = TractionController(did_label).verify_credential(vc)
+    verifications = await TractionController(did_label).verify_credential(vc)
     return JSONResponse(status_code=200, content=verifications)
 
 
@@ -90,22 +306,53 @@ async def verify_credential(
     summary="Updates the status of an issued credential.",
 )
 async def update_credential_status(
-    did_label: str, request: Request, request_body: UpdateCredentialStatusSchema
+    did_label: str,
+    request: Request,
+    request_body: UpdateCredentialStatusSchema,
+    askar: AskarUnitOfWork = Depends(unit_of_work),
 ):
     await auth.is_authorized(did_label, request)
     request_body = request_body.model_dump(by_alias=True, exclude_none=True)
     credential_id = request_body["credentialId"]
     credential_status = request_body["credentialStatus"]
-    await TractionController(did_label).change_credential_status(credential_id, credential_status)
+    await TractionController(did_label, askar).change_credential_status(credential_id, credential_status)
+    await askar.commit()
 
     return JSONResponse(status_code=200, content={"message": "Status updated"})
 
 
+@router.post(
+    "/{did_label}/credentials/status/batch",
+    tags=["Credentials"],
+    dependencies=[Depends(JWTBearer())],
+    summary="Updates the status of many issued credentials at once.",
+)
+async def update_credentials_status(
+    did_label: str,
+    request: Request,
+    request_body: BatchUpdateCredentialStatusSchema,
+    askar: AskarUnitOfWork = Depends(unit_of_work),
+):
+    await auth.is_authorized(did_label, request)
+    request_body = request_body.model_dump(by_alias=True, exclude_none=True)
+    results = await TractionController(did_label, askar).change_credentials_status(request_body["updates"])
+    await askar.commit()
+
+    return JSONResponse(status_code=200, content={"results": results})
+
+
 @router.get(
     "/{did_label}/credentials/status/{status_credential_id}",
     tags=["Credentials"],
     summary="Returns a status list credential",
 )
-async def get_status_list_credential(did_label: str, status_credential_id: str):
-    status_credential = await TractionController(did_label).get_status_list_credential()
-    return JSONResponse(status_code=200, content=status_credential)
+async def get_status_list_credential(did_label: str, status_credential_id: str, request: Request):
+    status_credential = await TractionController(did_label).get_status_list_credential(status_credential_id)
+    if status_credential.not_modified(request.headers):
+        return Response(status_code=304, headers=status_credential.headers())
+    return Response(
+        status_code=200,
+        content=status_credential.body,
+        media_type="application/json",
+        headers=status_credential.headers(),
+    )
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, Request, Security
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from app.models.web_requests import CreateDIDWebInput
 from app.controllers import auth
 from app.controllers.traction import TractionController
-from app.controllers.askar import AskarController
+from app.controllers.did_document import did_documents
 from config import settings
 from app.utils import did_from_label
 from app.auth.bearer import JWTBearer
@@ -46,30 +46,15 @@ async def register_org_did(
     tags=["Identifiers"],
     summary="Get a DID's latest keys, services and capabilities",
 )
-async def get_did(did_label: str):
-    did = did_from_label(did_label)
-    did_document = {
-        '@context': [
-            "https://www.w3.org/ns/did/v1",
-            "https://w3id.org/security/v2",
-            "https://w3id.org/traceability/v1"
-        ],
-        'id': did,
-        'verificationMethod': [{
-            'id': f'{did}#verkey',
-            'type': 'Ed25519VerificationKey2018',
-            'controller': did,
-            'publicKeyBase58': await AskarController(did_label).fetch('verkey')
-        }],
-        'authentication': [ f'{did}#verkey'],
-        'assertionMethod': [ f'{did}#verkey'],
-        'service': [{
-            'id': f'{did}#traceability-api',
-            'type': ["TraceabilityAPI"],
-            'serviceEndpoint': f'{settings.HTTPS_BASE}/{settings.DID_NAMESPACE}/{did_label}'
-        }]
-    }
-    return JSONResponse(status_code=200, content=did_document)
+async def get_did(did_label: str, request: Request):
+    did_document = await did_documents.get(did_label)
+    if did_document.not_modified(request.headers):
+        return Response(status_code=304, headers=did_document.headers())
+    return Response(
+        content=did_document.body,
+        media_type="application/json",
+        headers=did_document.headers(),
+    )
 
 
 @router.get(
@@ -80,5 +65,5 @@ async def get_did(did_label: str):
 )
 async def get_did(did_label: str, did: str, request: Request):
     await auth.is_authorized(did_label, request)
-    response = {"didDocument": TractionController(did_label).resolve_did(did)}
+    response = {"didDocument": await TractionController(did_label).resolve_did(did)}
     return JSONResponse(status_code=200, content=response)
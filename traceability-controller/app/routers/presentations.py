@@ -4,6 +4,7 @@ from typing import Annotated
 from config import settings
 from app.validations import ValidationException
 from app.controllers import askar, agent, auth
+from app.controllers.traction import TractionController
 from app.auth.bearer import JWTBearer
 from app.auth.handler import is_authorized
 
@@ -24,10 +25,14 @@ async def create_presentation_auth(
     await auth.is_authorized(did_label, request)
     vp = await request.json()
 
-    for vc in vp["verifiableCredential"]:
-        verified = agent.verify_credential(vc)
-
-    return JSONResponse(status_code=200, content={})
+    credential_results = await TractionController(did_label).verify_credentials(
+        vp.get("verifiableCredential", [])
+    )
+    response = {
+        "verified": all(result["verified"] for result in credential_results),
+        "credentialResults": credential_results,
+    }
+    return JSONResponse(status_code=200, content=response)
 
 
 @router.post(
@@ -61,8 +66,8 @@ async def sign_presentation(did_label: str, request: Request):
     if "created" in options:
         options.pop("created")
     options["proofPurpose"] = "assertionMethod"
-    verkey = agent.get_verkey(did)
-    vp = agent.sign_json_ld(presentation, options, verkey)
+    verkey = await agent.get_verkey(did)
+    vp = await agent.sign_json_ld(presentation, options, verkey)
 
     return JSONResponse(status_code=201, content={"verifiablePresentation": vp})
 
@@ -79,7 +84,8 @@ async def verify_presentation(did_label: str, request: Request):
     request = await request.json()
 
     vp = request["verifiablePresentation"]
-    verified = agent.verify_presentation(vp)
+    options = request.get("options", {})
+    verified = await TractionController(did_label).verify_presentation(vp, options)
 
     return JSONResponse(status_code=200, content=verified)
 
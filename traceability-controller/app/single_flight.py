@@ -0,0 +1,40 @@
+import asyncio
+
+
+class SingleFlight:
+    """Runs at most one task per key, concurrent callers of a key share it.
+
+    A key is forgotten once its task is done. Errors are raised to the callers
+    awaiting the task, a task nobody waits on fails silently and is started
+    again by the next caller.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def __contains__(self, key):
+        task = self.tasks.get(key)
+        return task is not None and not task.done()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def start(self, key, function, *args):
+        """The running task of key, started with function(*args) if there is none."""
+        task = self.tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(function(*args))
+            task.add_done_callback(lambda task: self._done(key, task))
+            self.tasks[key] = task
+        return task
+
+    async def run(self, key, function, *args):
+        """Awaits the task of key, a cancelled caller leaves it running for the others."""
+        return await asyncio.shield(self.start(key, function, *args))
+
+    def _done(self, key, task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        # Errors are raised to awaiting callers
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,84 @@
+import json
+import random
+from bitarray import bitarray
+from app.validations import ValidationException
+
+
+class StatusBitmap:
+    """Tracks which status list indexes are allocated, one bit per index."""
+
+    # Random probes before falling back to a scan from a random offset
+    PROBES = 32
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.allocated = bits.count()
+
+    @classmethod
+    def new(cls, length):
+        bits = bitarray(length)
+        bits.setall(0)
+        # The first and last indexes are never handed out
+        bits[0] = bits[length - 1] = 1
+        return cls(bits)
+
+    @classmethod
+    def from_bytes(cls, data, length):
+        if data[:1] == b"[":
+            # Entries were stored as a json list of indexes before the bitmap
+            return cls.from_entries(data, length)
+        bits = bitarray()
+        bits.frombytes(bytes(data))
+        del bits[length:]
+        return cls(bits)
+
+    @classmethod
+    def from_entries(cls, data, length):
+        bitmap = cls.new(length)
+        for index in json.loads(bytes(data)):
+            bitmap.bits[index] = 1
+        bitmap.allocated = bitmap.bits.count()
+        return bitmap
+
+    def to_bytes(self):
+        return self.bits.tobytes()
+
+    @property
+    def length(self):
+        return len(self.bits)
+
+    @property
+    def fill_level(self):
+        return self.allocated / self.length
+
+    def is_allocated(self, index):
+        return bool(self.bits[index])
+
+    def allocate(self):
+        """Allocate a random free index."""
+        if self.allocated >= self.length:
+            raise ValidationException(
+                status_code=500, content={"message": "Status list is full"}
+            )
+        for _ in range(self.PROBES):
+            index = random.randrange(self.length)
+            if not self.bits[index]:
+                return self._take(index)
+        # Mostly full, take the next free index after a random offset
+        start = random.randrange(self.length)
+        try:
+            index = self.bits.index(0, start)
+        except ValueError:
+            index = self.bits.index(0, 0, start)
+        return self._take(index)
+
+    def release(self, indexes):
+        for index in indexes:
+            if self.bits[index]:
+                self.bits[index] = 0
+                self.allocated -= 1
+
+    def _take(self, index):
+        self.bits[index] = 1
+        self.allocated += 1
+        return index
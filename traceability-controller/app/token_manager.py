@@ -0,0 +1,83 @@
+import asyncio
+import time
+import jwt
+from config import settings
+from app import http_client
+from app.single_flight import SingleFlight
+from app.validations import ValidationException
+
+
+class TractionTokenManager:
+    """Caches the traction tenant token shared by every controller in the worker.
+
+    The token is renewed in the background shortly before it expires and concurrent
+    callers always wait on a single refresh request.
+    """
+
+    def __init__(self):
+        self.endpoint = f"{settings.TRACTION_API_ENDPOINT}/multitenancy/tenant/{settings.TRACTION_TENANT_ID}/token"
+        self.token = None
+        self.expires = 0
+        self.refreshing = SingleFlight()
+
+    async def get_token(self):
+        now = time.time()
+        if self.token and now < self.expires - settings.TRACTION_TOKEN_REFRESH_MARGIN:
+            return self.token
+        if self.token and now < self.expires:
+            # Still usable, renew without making the caller wait
+            self._start_refresh()
+            return self.token
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self, token):
+        # Only drop the rejected token, a newer one may already be cached
+        if self.token == token:
+            self.token = None
+            self.expires = 0
+
+    def _start_refresh(self):
+        # A failed background refresh is retried by the next caller
+        return self.refreshing.start("token", self._refresh)
+
+    async def _refresh(self):
+        r = await http_client.post(
+            self.endpoint, json={"api_key": settings.TRACTION_API_KEY}
+        )
+        try:
+            token = r.json()["token"]
+        except:
+            raise ValidationException(
+                status_code=r.status_code, content={"message": r.text}
+            )
+        self.token = token
+        self.expires = self._expiry(token)
+        return token
+
+    @staticmethod
+    def _expiry(token):
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+            return int(claims["exp"])
+        except:
+            return int(time.time()) + settings.TRACTION_TOKEN_TTL
+
+    async def request(self, method, url, headers=None, **kwargs):
+        """Send an authenticated traction request, fetching a new token once on 401."""
+        token = await self.get_token()
+        headers = {**(headers or {}), "Authorization": f"Bearer {token}"}
+        r = await http_client.request(method, url, headers=headers, **kwargs)
+        if r.status_code == 401:
+            self.invalidate(token)
+            headers["Authorization"] = f"Bearer {await self.get_token()}"
+            r = await http_client.request(method, url, headers=headers, **kwargs)
+        return r
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+
+token_manager = TractionTokenManager()
@@ -0,0 +1,155 @@
+"""Worker warm-up and cold start report.
+
+python -m app.warmup
+    Prints the slowest imports of the application and the time spent in each
+    warm-up step.
+"""
+import asyncio
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from config import settings
+from app.controllers.askar import AskarController, store_registry, tenant_labels
+from app.controllers.did_document import did_documents
+from app.controllers.status_lists import fetch_status_lists
+from app.controllers.traction import TractionController
+from app.token_manager import token_manager
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class Warmup:
+    """Fills a worker's pools and caches before it reports ready.
+
+    The default store is opened and the traction token fetched, then the DID
+    document, status list registry and signed active status list of each
+    warm-up tenant are loaded. Failed steps are reported and left to be filled
+    by the first request.
+
+    Each worker warms its own pools and caches. When main.py starts several
+    workers, a warm worker leaves a marker named after its pid in WARMUP_DIR so
+    any worker can tell whether all of them are ready.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.timings = {}
+        self.errors = {}
+
+    async def step(self, name, coroutine):
+        started = time.perf_counter()
+        try:
+            return await coroutine
+        except Exception as e:
+            self.errors[name] = getattr(e, "content", None) or repr(e)
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 4)
+
+    async def tenants(self):
+        if settings.WARMUP_TENANTS:
+            return [label.strip() for label in settings.WARMUP_TENANTS.split(",") if label.strip()]
+        return (await tenant_labels())[: settings.WARMUP_TENANT_LIMIT]
+
+    async def warm_tenant(self, did_label):
+        await did_documents.get(did_label)
+        registry = await fetch_status_lists(did_label)
+        await TractionController(did_label).get_status_list_credential(registry["active"])
+
+    async def run(self):
+        started = time.perf_counter()
+        await self.step("store", AskarController().open())
+        await self.step("token", token_manager.get_token())
+        did_labels = await self.step("tenants", self.tenants()) or []
+
+        semaphore = asyncio.Semaphore(settings.WARMUP_CONCURRENCY)
+
+        async def warm(did_label):
+            async with semaphore:
+                await self.step(f"tenant:{did_label}", self.warm_tenant(did_label))
+
+        await asyncio.gather(*[warm(did_label) for did_label in did_labels])
+        self.timings["total"] = round(time.perf_counter() - started, 4)
+        self.ready = True
+        self.mark(warm=True)
+        logger.info(
+            f"Warm-up done in {self.timings['total']}s, {len(did_labels)} tenants, "
+            f"{len(self.errors)} errors"
+        )
+
+    def mark(self, warm):
+        if not settings.WARMUP_DIR:
+            return
+        marker = os.path.join(settings.WARMUP_DIR, str(os.getpid()))
+        if warm:
+            open(marker, "w").close()
+        elif os.path.exists(marker):
+            os.remove(marker)
+
+    @staticmethod
+    def running(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        # A killed worker is a zombie until uvicorn reaps it
+        try:
+            with open(f"/proc/{pid}/stat") as stat:
+                return stat.read().rpartition(")")[2].split()[0] != "Z"
+        except OSError:
+            return True
+
+    def warm_workers(self):
+        """Number of running workers done warming up, markers of exited workers are ignored."""
+        return sum(
+            1 for name in os.listdir(settings.WARMUP_DIR) if name.isdigit() and self.running(int(name))
+        )
+
+    def all_ready(self):
+        """Whether every worker is warm, or this worker when it runs alone."""
+        if not settings.WARMUP_DIR:
+            return self.ready
+        return self.ready and self.warm_workers() >= settings.WORKERS
+
+    def report(self):
+        return {"ready": self.ready, "timings": self.timings, "errors": self.errors}
+
+
+warmup = Warmup()
+
+
+def import_report(module="app.api", top=15):
+    """Cumulative import time of the slowest modules, in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            timings.append((match.group(3), int(match.group(1)) / 1e6))
+    timings.sort(key=lambda timing: timing[1], reverse=True)
+    return timings[:top]
+
+
+async def main():
+    print("Imports (cumulative)")
+    for module, seconds in import_report():
+        print(f"  {seconds:8.3f}s  {module}")
+    try:
+        await warmup.run()
+    finally:
+        await store_registry.close_all()
+    print("Warm-up")
+    for name, seconds in warmup.timings.items():
+        print(f"  {seconds:8.3f}s  {name}")
+    for name, error in warmup.errors.items():
+        print(f"  failed {name}: {error}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
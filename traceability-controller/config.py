@@ -23,18 +23,111 @@ class Settings(BaseSettings):
     TRACEABILITY_ADMIN_API_KEY: str = TRACTION_API_KEY
     # Minimum lenght of 16KB
     STATUS_LIST_LENGHT: int = 200000
+    # Signed status list credentials are valid for STATUS_LIST_TTL seconds and
+    # re-signed STATUS_LIST_REFRESH_MARGIN seconds before they expire
+    STATUS_LIST_TTL: int = 300
+    STATUS_LIST_REFRESH_MARGIN: int = 60
+    # Cache-Control max-age of served status lists
+    STATUS_LIST_MAX_AGE: int = 60
+    STATUS_LIST_CACHE_SIZE: int = 1000
+    # Status lists fetched while verifying are kept for their http cache lifetime,
+    # or STATUS_LIST_REMOTE_TTL seconds without cache headers, within a byte budget
+    STATUS_LIST_REMOTE_TTL: int = 300
+    STATUS_LIST_REMOTE_CACHE_BYTES: int = 64 * 1024 * 1024
+    # Workers load the pools and caches of the WARMUP_TENANTS labels (comma
+    # separated) before reporting ready, or of the first WARMUP_TENANT_LIMIT
+    # registered tenants when none are listed
+    WARMUP: bool = True
+    # Uvicorn worker processes started by main.py, each marks itself warm in
+    # WARMUP_DIR and the server is ready once all of them are
+    WORKERS: int = 4
+    WARMUP_DIR: str = ""
+    WARMUP_TENANTS: str = ""
+    WARMUP_TENANT_LIMIT: int = 50
+    WARMUP_CONCURRENCY: int = 10
+    # Default and maximum page size of credential listings
+    CREDENTIALS_PAGE_SIZE: int = 100
+    CREDENTIALS_MAX_PAGE_SIZE: int = 1000
+    # Maximum number of items accepted by batch endpoints
+    BATCH_MAX_SIZE: int = 10000
+    # Concurrent signing requests sent to traction by a batch issuance
+    ISSUANCE_CONCURRENCY: int = 10
+    # Credentials of a presentation verified at the same time
+    VERIFICATION_CONCURRENCY: int = 10
+    # Status list indexes leased at once by each worker
+    STATUS_LIST_LEASE_SIZE: int = 64
+    # Fill level at which a tenant's next status list is opened
+    STATUS_LIST_ROLLOVER_THRESHOLD: float = 0.9
 
     POSTGRES_URI: str = os.environ["POSTGRES_URI"]
 
     # We derive the public storage askar key from the traction api key
     ASKAR_DEFAULT_DB: str = 'traceability'
+    # Keep every tenant in a profile of the default database instead of a
+    # database per tenant
+    ASKAR_PROFILES: bool = False
+    # Stores kept open per worker and connection pool sizing for each of them
+    ASKAR_MAX_OPEN_STORES: int = 50
+    ASKAR_MAX_CONNECTIONS: int = 10
+    ASKAR_MIN_CONNECTIONS: int = 0
+    ASKAR_CONNECT_TIMEOUT: int = 10
+    ASKAR_IDLE_TIMEOUT: int = 300
 
     # To be removed when new routes are added to traction
     VERIFIER_ENDPOINT: str = os.environ["VERIFIER_ENDPOINT"]
     VERIFIER_API_KEY: str = TRACTION_API_KEY
+    # Verify Ed25519Signature2018 proofs in process, the verifier agent is
+    # still used for other proof suites
+    LOCAL_VERIFICATION: bool = True
+    # JSON-LD contexts which are not bundled are cached once fetched,
+    # JSONLD_OFFLINE rejects them instead. The traceability vocabulary is not
+    # bundled as it keeps changing, offline its credentials fail verification
+    JSONLD_CACHE_SIZE: int = 100
+    JSONLD_CACHE_TTL: int = 24 * 60 * 60
+    JSONLD_OFFLINE: bool = False
+    # Resolved DID documents are cached for DID_CACHE_TTL seconds, not found
+    # results for DID_CACHE_NEGATIVE_TTL seconds
+    DID_CACHE_SIZE: int = 1000
+    DID_CACHE_TTL: int = 300
+    DID_CACHE_NEGATIVE_TTL: int = 30
+    # did.json of our tenants is kept in memory, other workers see key or
+    # service changes within DID_DOCUMENT_CACHE_TTL seconds, and a new tenant
+    # within DID_DOCUMENT_NEGATIVE_TTL seconds
+    DID_DOCUMENT_CACHE_SIZE: int = 10000
+    DID_DOCUMENT_CACHE_TTL: int = 3600
+    DID_DOCUMENT_NEGATIVE_TTL: int = 30
+    # Cache-Control max-age of served did.json documents
+    DID_DOCUMENT_MAX_AGE: int = 300
 
     JWT_ALGORITHM: str = "HS256"
     JWT_SECRET: str = TRACTION_API_KEY
+    # Tenant client ids are kept in memory to authorize requests, other workers
+    # see new client credentials within CLIENT_BINDING_CACHE_TTL seconds
+    CLIENT_BINDING_CACHE_SIZE: int = 10000
+    CLIENT_BINDING_CACHE_TTL: int = 300
+    # Lifetime of tokens issued by /oauth/token, a client's last token is
+    # returned again while it has more than OAUTH_TOKEN_REUSE_MARGIN seconds left
+    OAUTH_TOKEN_TTL: int = 600
+    OAUTH_TOKEN_REUSE_MARGIN: int = 60
+    # Client secret hashes are cached, unknown client ids for CLIENT_HASH_NEGATIVE_TTL
+    CLIENT_HASH_CACHE_SIZE: int = 10000
+    CLIENT_HASH_CACHE_TTL: int = 300
+    CLIENT_HASH_NEGATIVE_TTL: int = 30
+
+    # Shared async http client used for traction and verifier calls
+    HTTP_POOL_SIZE: int = 100
+    HTTP_POOL_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    # Signing and verification can be slower than other traction calls
+    TRACTION_SIGN_TIMEOUT: float = 30.0
+    VERIFIER_TIMEOUT: float = 30.0
+
+    # Renew the cached traction token this many seconds before it expires,
+    # tokens without an exp claim are kept for TRACTION_TOKEN_TTL seconds
+    TRACTION_TOKEN_REFRESH_MARGIN: int = 60
+    TRACTION_TOKEN_TTL: int = 3600
 
 
 settings = Settings()
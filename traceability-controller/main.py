@@ -1,12 +1,25 @@
+import os
+import tempfile
 import uvicorn
-from app.controllers.askar import AskarController
+from app.controllers.askar import AskarController, store_registry
+from config import settings
 import asyncio
 
+
+async def provision():
+    await AskarController().provision()
+    # Workers open their own stores
+    await store_registry.close_all()
+
+
 if __name__ == "__main__":
-    asyncio.run(AskarController().provision())
-    uvicorn.run(
-        "app.api:app",
-        host="0.0.0.0",
-        port=8000,
-        workers=4,
-    )
+    asyncio.run(provision())
+    # Shared by the workers to report when they are all warm
+    with tempfile.TemporaryDirectory(prefix="warmup-") as warmup_dir:
+        os.environ["WARMUP_DIR"] = warmup_dir
+        uvicorn.run(
+            "app.api:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=settings.WORKERS,
+        )
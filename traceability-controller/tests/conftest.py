@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+# Settings are read when app modules are imported, tests run against sqlite
+os.environ.setdefault("TRACEABILITY_CONTROLLER_DOMAIN", "example.com")
+os.environ.setdefault("TRACTION_API_ENDPOINT", "http://traction")
+os.environ.setdefault("TRACTION_API_KEY", "test")
+os.environ.setdefault("TRACTION_TENANT_ID", "test")
+os.environ.setdefault("VERIFIER_ENDPOINT", "http://verifier")
+os.environ["POSTGRES_URI"] = f"sqlite://{tempfile.mkdtemp()}"
+os.environ["WARMUP"] = "false"
+
+
+import asyncio
+import json
+import time
+import uuid
+import httpx
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+from app import http_client
+from app.api import app
+from app.auth.handler import signJWT
+from app.controllers.askar import AskarController, store_registry
+
+VERKEY = "H3C2AVvLMv6gmMNam3uVAjZpfkcJCwDwnZn6z3wXmqPV"
+
+
+def traction(request):
+    """Traction stand-in, signing adds a placeholder proof."""
+    if request.url.path.endswith("/token"):
+        return httpx.Response(200, json={"token": jwt.encode({"exp": int(time.time()) + 3600}, "test")})
+    if request.url.path == "/wallet/did/create":
+        return httpx.Response(200, json={"result": {"verkey": VERKEY}})
+    if request.url.path == "/jsonld/sign":
+        credential = json.loads(request.content)["doc"]["credential"]
+        return httpx.Response(200, json={"signed_doc": {**credential, "proof": {"type": "Ed25519Signature2018"}}})
+    return httpx.Response(404, text="Not found")
+
+
+@pytest.fixture
+def client():
+    async def provision():
+        await AskarController().provision()
+        await store_registry.close_all()
+
+    asyncio.run(provision())
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(traction))
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def tenant(client):
+    """A registered tenant's label and the headers of its client."""
+    did_label = f"tenant-{uuid.uuid4().hex[:12]}"
+    r = client.post(
+        "/organization/",
+        json={"label": did_label},
+        headers={"X-API-Key": "test"},
+    )
+    assert r.status_code == 201, r.text
+    token = signJWT(r.json()["client_id"])["access_token"]
+    return did_label, {"Authorization": f"Bearer {token}"}
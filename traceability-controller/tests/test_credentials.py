@@ -0,0 +1,66 @@
+import uuid
+from config import settings
+from app.utils import status_list_decode
+
+
+def credential(did_label, **fields):
+    return {
+        "@context": ["https://www.w3.org/2018/credentials/v1"],
+        "id": f"urn:uuid:{uuid.uuid4()}",
+        "type": ["VerifiableCredential"],
+        "issuer": f"{settings.DID_WEB_BASE}:organization:{did_label}",
+        "issuanceDate": "2024-01-01T00:00:00Z",
+        "credentialSubject": {"id": "did:example:123"},
+        **fields,
+    }
+
+
+def issue(client, did_label, headers):
+    body = {"credential": credential(did_label), "options": {"type": "Ed25519Signature2018"}}
+    r = client.post(f"/organization/{did_label}/credentials/issue", json=body, headers=headers)
+    assert r.status_code == 201, r.text
+    return r.json()["verifiableCredential"]
+
+
+def test_issued_credential_is_stored(client, tenant):
+    did_label, headers = tenant
+    vc = issue(client, did_label, headers)
+    assert vc["credentialStatus"]["statusListCredential"].startswith(settings.HTTPS_BASE)
+
+    r = client.get(f"/organization/{did_label}/credentials/{vc['id']}", headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json() == vc
+
+
+def test_status_update_is_stored(client, tenant):
+    did_label, headers = tenant
+    vc = issue(client, did_label, headers)
+    status_list_id = vc["credentialStatus"]["statusListCredential"].split("/")[-1]
+
+    body = {"credentialId": vc["id"], "credentialStatus": [{"type": "StatusList2021Entry", "status": "1", "statusPurpose": "revocation"}]}
+    r = client.post(f"/organization/{did_label}/credentials/status", json=body, headers=headers)
+    assert r.status_code == 200, r.text
+
+    r = client.get(f"/organization/{did_label}/credentials/status/{status_list_id}")
+    assert r.status_code == 200, r.text
+    status_list = status_list_decode(r.json()["credentialSubject"]["encodedList"])
+    assert status_list[vc["credentialStatus"]["statusListIndex"]]
+
+
+def test_pages_are_stable_while_issuing(client, tenant):
+    did_label, headers = tenant
+    issued = [issue(client, did_label, headers)["id"] for _ in range(7)]
+
+    listed, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        r = client.get(f"/organization/{did_label}/credentials", params=params, headers=headers)
+        assert r.status_code == 200, r.text
+        listed += [vc["id"] for vc in r.json()["credentials"]]
+        cursor = r.json()["next"]
+        if not cursor:
+            break
+        # Credentials issued between pages come after the ones already listed
+        issued.append(issue(client, did_label, headers)["id"])
+
+    assert listed == issued
@@ -0,0 +1,45 @@
+import asyncio
+import uuid
+from config import settings
+from app.controllers.askar import AskarController, store_registry
+from app.controllers.status_leases import StatusIndexLeases
+from app.controllers.status_lists import fetch_status_lists, register_status_lists
+
+
+async def allocate(pools, did_label, allocations):
+    """Allocates indexes concurrently, round robin over pools standing in for workers."""
+    await AskarController(did_label).provision()
+    await register_status_lists(did_label)
+    try:
+        return await asyncio.gather(
+            *[
+                pools[allocation % len(pools)].next_index(did_label)
+                for allocation in range(allocations)
+            ]
+        )
+    finally:
+        await store_registry.close_all()
+
+
+def test_concurrent_leases_never_share_an_index():
+    pools = [StatusIndexLeases(block_size=8) for _ in range(4)]
+    indexes = asyncio.run(allocate(pools, f"leases-{uuid.uuid4().hex}", 300))
+    assert len(set(indexes)) == 300
+
+
+def test_concurrent_leases_roll_over_full_lists(monkeypatch):
+    monkeypatch.setattr(settings, "STATUS_LIST_LENGHT", 64)
+    did_label = f"rollover-{uuid.uuid4().hex}"
+    pools = [StatusIndexLeases(block_size=8) for _ in range(4)]
+    indexes = asyncio.run(allocate(pools, did_label, 300))
+    assert len(set(indexes)) == 300
+
+    async def registry():
+        try:
+            return await fetch_status_lists(did_label)
+        finally:
+            await store_registry.close_all()
+
+    lists = asyncio.run(registry())["lists"]
+    assert {list_id for list_id, index in indexes} <= set(lists)
+    assert all(0 <= index < 64 for list_id, index in indexes)